@@ -0,0 +1,60 @@
+"""CPU per call of web3 contract functions against the FastFunction path.
+
+    python -m benchmark.abi_call
+
+No node is needed: return data is encoded locally and both paths encode the
+same arguments and decode the same bytes.
+"""
+import timeit
+
+from eth_abi import encode_abi
+from web3 import Web3
+from web3._utils.abi import get_abi_output_types, map_abi_data
+from web3._utils.normalizers import BASE_RETURN_NORMALIZERS
+
+from contract.liquidity_pool import LiquidityPool
+from contract.reader import Reader
+from lib.address import Address
+
+POOL = '0xFE62314f9FB010BEBF52808cD5A4c571a47c4c46'
+TRADER = '0x1Ef9Db1C1EAF2240DA2a78e581d53b9e833295BE'
+NUMBER = 2000
+
+
+def web3_call(contract, name, args, return_data):
+    # what ContractFunction.call does around the eth_call
+    function = getattr(contract.functions, name)(*args)
+    function._encode_transaction_data()
+    output_types = get_abi_output_types(function.abi)
+    return map_abi_data(BASE_RETURN_NORMALIZERS, output_types, contract.web3.codec.decode_abi(output_types, return_data))
+
+
+def fast_call(fast_function, address, args, return_data):
+    return fast_function(address, *args).decode(return_data)
+
+
+def bench(title, contract, fast_function, address, args, return_data):
+    name = fast_function.name
+    web3_time = timeit.timeit(lambda: web3_call(contract, name, args, return_data), number=NUMBER) / NUMBER
+    fast_time = timeit.timeit(lambda: fast_call(fast_function, address, args, return_data), number=NUMBER) / NUMBER
+    print(f"{title:<32} web3:{web3_time*1e6:10.1f}us  fast:{fast_time*1e6:10.1f}us  saved:{(web3_time-fast_time)*1e6:10.1f}us")
+
+
+def main():
+    web3 = Web3()
+    reader = Reader(web3, Address(POOL))
+    pool = LiquidityPool(web3, Address(POOL))
+
+    accounts = [('0x%040x' % (i + 1), 10**18, 10**20, True) for i in range(100)]
+    bench("getAccountsInfo(100 accounts)", reader.contract, Reader.get_accounts_info, POOL, (POOL, 0, 0, 100),
+          encode_abi(Reader.get_accounts_info.output_types, [True, accounts]))
+    bench("getPerpetualInfo", pool.contract, LiquidityPool.get_perpetual_info, POOL, (0,),
+          encode_abi(LiquidityPool.get_perpetual_info.output_types, [2, TRADER, [10**18] * 36]))
+    bench("getMarginAccount", pool.contract, LiquidityPool.get_margin_account, POOL, (0, TRADER),
+          encode_abi(LiquidityPool.get_margin_account.output_types, [1, 2, 3, 4, 5, True, True, True]))
+    bench("liquidateByAMM", pool.contract, LiquidityPool.liquidate_by_amm, POOL, (0, TRADER),
+          encode_abi(LiquidityPool.liquidate_by_amm.output_types, [0]))
+
+
+if __name__ == '__main__':
+    main()
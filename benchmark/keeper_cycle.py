@@ -0,0 +1,137 @@
+"""End-to-end throughput of Keeper._check_all_perpetuals against the mock node.
+
+    python -m benchmark.keeper_cycle --pools 20 --accounts 2000 --latency 0.02
+
+Runs a cold cycle that fetches every account, a warm cycle on the next block,
+then drops the mark price so that about a tenth of the accounts go unsafe and
+runs a liquidation cycle, and once the liquidations are sent an events cycle
+that applies their Liquidate events. Reports the time, HTTP requests and JSON-RPC calls of
+each cycle, the detection-to-submission latency of the liquidations and the
+peak memory, with --tracemalloc also the peak python heap. The config package must be importable, settings are given through
+the environment before it is loaded.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from .mock_node import MockNode, MULTICALL_ADDRESS, READER_ADDRESS, WAD
+
+# any key works against the mock node
+KEEPER_KEY = '0x' + '11' * 32
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def run_cycle(title, keeper, node):
+    node.reset_stats()
+    start = time.perf_counter()
+    keeper._check_all_perpetuals()
+    elapsed = time.perf_counter() - start
+    rpc_calls = sum(count for name, count in node.calls.items() if name.startswith('eth_'))
+    print(f"{title:<12} time:{elapsed*1e3:10.1f}ms  http requests:{node.http_requests:6d}  rpc calls:{rpc_calls:6d}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="keeper cycle benchmark against a local mock node")
+    parser.add_argument('--pools', type=int, default=10)
+    parser.add_argument('--accounts', type=int, default=1000, help="accounts per pool")
+    parser.add_argument('--latency', type=float, default=0.01, help="seconds added to every http request")
+    parser.add_argument('--error-rate', type=float, default=0, help="share of requests answered with an error")
+    parser.add_argument('--stall-rate', type=float, default=0, help="share of http requests delayed by another 0.5s")
+    parser.add_argument('--endpoints', type=int, default=1, help="endpoints of the node the keeper is given")
+    parser.add_argument('--max-page-size', type=int, default=None, help="larger getAccountsInfo pages fail on the node")
+    parser.add_argument('--multicall', action='store_true', help="bundle calls through multicall instead of batch requests")
+    parser.add_argument('--drop', type=float, default=0.08, help="mark price drop of the liquidation cycle")
+    parser.add_argument('--tracemalloc', action='store_true', help="report peak python heap, slows down the keeper")
+    parser.add_argument('--verbose', action='store_true', help="keep keeper logs")
+    args = parser.parse_args()
+
+    node = MockNode(args.pools, args.accounts, args.latency, args.error_rate, max_page_size=args.max_page_size,
+                    stall_rate=args.stall_rate).start()
+    urls = [node.url] + [node.add_endpoint() for _ in range(args.endpoints - 1)]
+    key_file = tempfile.NamedTemporaryFile('w', suffix='.key', delete=False)
+    key_file.write(KEEPER_KEY)
+    key_file.close()
+    os.environ.update({
+        'ETH_RPC_URL': ",".join(urls),
+        'KEEPER_KEY': key_file.name,
+        'IS_USE_WHITELIST': '1',
+        'PERPETUAL_LIST': json.dumps(node.perpetuals),
+        'READER_ADDRESS': READER_ADDRESS,
+        'MULTICALL_ADDRESS': MULTICALL_ADDRESS if args.multicall else '',
+        'SNAPSHOT_PATH': '',
+        'RECEIPT_POLL_INTERVAL': '0.1',
+    })
+
+    import config
+    # console only, the file handler needs ./log
+    config.LOG_CONFIG['handlers'] = {'console': config.LOG_CONFIG['handlers']['console']}
+    config.LOG_CONFIG['root'] = {'level': 'INFO' if args.verbose else 'WARNING', 'handlers': ['console']}
+    from keeper import Keeper
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    keeper = Keeper([])
+    if not keeper._check_keeper_account():
+        sys.exit(1)
+    keeper._set_liquidity_pools()
+    keeper.submitter.start()
+
+    # detection time of every liquidation handed to the submitter
+    detected = {}
+    submit = keeper.submitter.submit
+
+    def timed_submit(liquidation):
+        detected.setdefault((liquidation.pool.address.address, liquidation.trader), time.time())
+        return submit(liquidation)
+    keeper.submitter.submit = timed_submit
+
+    print(f"pools:{args.pools} accounts:{args.pools * args.accounts} latency:{args.latency*1e3:.1f}ms "
+          f"error rate:{args.error_rate} stall rate:{args.stall_rate} endpoints:{args.endpoints} "
+          f"{'multicall' if args.multicall else 'batch request'}")
+    run_cycle("cold", keeper, node)
+    node.mine()
+    run_cycle("warm", keeper, node)
+    node.mine()
+    node.set_mark_price(int(100 * (1 - args.drop)) * WAD)
+    price_moved = time.time()
+    run_cycle("liquidation", keeper, node)
+
+    # wait for the sender to drain
+    deadline = time.time() + 60
+    while time.time() < deadline and (not keeper.submitter.queue.empty() or len(keeper.submitter.liquidations) > 0):
+        time.sleep(0.05)
+    node.mine()
+    run_cycle("events", keeper, node)
+    if args.tracemalloc:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    latencies = []
+    for (pool, trader), sent_at in node.liquidations.items():
+        detected_at = detected.get((pool, bytes.fromhex(trader[2:])))
+        if detected_at is not None:
+            latencies.append(sent_at - detected_at)
+    print(f"liquidations sent:{len(node.liquidations)} detected:{len(detected)}")
+    if len(latencies) > 0:
+        first = min(node.liquidations.values()) - price_moved
+        print(f"detection to submission p50:{percentile(latencies, 0.5)*1e3:.1f}ms p99:{percentile(latencies, 0.99)*1e3:.1f}ms "
+              f"max:{max(latencies)*1e3:.1f}ms  price move to first send:{first*1e3:.1f}ms")
+    print(f"max rss:{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024:.1f}MiB")
+    if args.tracemalloc:
+        print(f"peak traced memory:{peak/2**20:.1f}MiB")
+    node.stop()
+    os.unlink(key_file.name)
+
+
+if __name__ == '__main__':
+    main()
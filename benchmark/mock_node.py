@@ -0,0 +1,382 @@
+"""A local JSON-RPC stand-in for an eth node serving MCDEX pools.
+
+    python -m benchmark.mock_node --pools 10 --accounts 1000 --latency 0.02
+
+Every pool has one perpetual with the given number of accounts, half long
+and half short, with a margin buffer of 6% to 40% of the mark price. Calls of
+the Reader, LiquidityPool and Multicall functions the keeper uses are answered
+from that state, liquidations of safe accounts fail gas estimation, sent
+liquidations over the base fee remove the account at once and receipts are
+always successful, cheaper ones stay pending. Liquidations and trades emit
+their pool events in the next block, for eth_getLogs. latency is added to
+every HTTP request, stall_rate is the share of HTTP requests delayed by
+another stall seconds, error_rate is the share of JSON-RPC requests answered
+with an error and getAccountsInfo calls over max_page_size accounts fail as
+out of gas. add_endpoint serves the same state on another port, e.g. to stand
+in for a second node.
+"""
+import argparse
+import hashlib
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import rlp
+from eth_abi import decode_abi, encode_abi
+from eth_utils import event_abi_to_log_topic, function_abi_to_4byte_selector, to_checksum_address
+from web3._utils.abi import get_abi_input_types, get_abi_output_types
+
+from contract.liquidity_pool import LiquidityPool
+from contract.multicall import Multicall
+from contract.reader import Reader
+
+WAD = 10**18
+MAINTENANCE_MARGIN_RATE = WAD // 20
+MULTICALL_ADDRESS = '0x00000000000000000000000000000000000ca11a'
+READER_ADDRESS = '0x00000000000000000000000000000000000ead3a'
+
+
+def _functions(*abis) -> dict:
+    functions = {}
+    for abi in abis:
+        for item in abi:
+            if item['type'] == 'function':
+                functions[function_abi_to_4byte_selector(item)] = (item['name'], get_abi_input_types(item), get_abi_output_types(item))
+    return functions
+
+
+def _events(abi) -> dict:
+    events = {}
+    for item in abi:
+        # the first of overloaded events
+        if item['type'] == 'event' and item['name'] not in events:
+            events[item['name']] = ('0x' + event_abi_to_log_topic(item).hex(), item)
+    return events
+
+
+FUNCTIONS = _functions(LiquidityPool.abi, Reader.abi, Multicall.abi)
+EVENTS = _events(LiquidityPool.abi)
+
+
+class MockPool:
+    def __init__(self, address: str, accounts: int, mark_price: int):
+        self.address = address
+        self.mark_price = mark_price
+        # trader -> [position, cash], in wad
+        self.accounts = {}
+        for i in range(accounts):
+            trader = to_checksum_address('0x%08x%032x' % (int(address[-8:], 16), i + 1))
+            buffer = 6 + i * 7919 % 35
+            if i % 2 == 0:
+                self.accounts[trader] = [WAD, (buffer - 100) * WAD]
+            else:
+                self.accounts[trader] = [-WAD, (100 + buffer) * WAD]
+        self.traders = list(self.accounts.keys())
+
+    def margin(self, trader) -> tuple:
+        position, cash = self.accounts.get(trader, (0, 0))
+        margin = cash + position * self.mark_price // WAD
+        return position, margin, margin >= abs(position) * self.mark_price // WAD * MAINTENANCE_MARGIN_RATE // WAD
+
+    def liquidate(self, trader):
+        if trader in self.accounts:
+            del self.accounts[trader]
+            self.traders.remove(trader)
+
+    def set_account(self, trader, position: int, cash: int):
+        if position == 0 and cash == 0:
+            self.liquidate(trader)
+            return
+        if trader not in self.accounts:
+            self.traders.append(trader)
+        self.accounts[trader] = [position, cash]
+
+
+class MockNode:
+    def __init__(self, pools: int, accounts: int, latency: float = 0, error_rate: float = 0, mark_price: int = 100 * WAD, seed: int = 0,
+                 max_page_size: int = None, stall_rate: float = 0, stall: float = 0.5):
+        self.pools = dict((address.lower(), MockPool(address, accounts, mark_price))
+                          for address in [to_checksum_address('0x%040x' % (0xb00100 + i)) for i in range(pools)])
+        self.latency = latency
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall = stall
+        # larger getAccountsInfo pages fail as out of gas
+        self.max_page_size = max_page_size
+        self.block_number = 100
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        # method or contract function -> count
+        self.calls = {}
+        self.http_requests = 0
+        # (pool, trader) -> arrival time of its liquidation transaction
+        self.liquidations = {}
+        self.receipts = {}
+        # raw logs, in order
+        self.logs = []
+        # transactions under the base fee are never mined
+        self.base_fee = 10**9
+        self.server = None
+        self.servers = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    @property
+    def perpetuals(self) -> list:
+        return [f"{pool.address}-0" for pool in self.pools.values()]
+
+    def set_mark_price(self, mark_price: int):
+        for pool in self.pools.values():
+            pool.mark_price = mark_price
+
+    def mine(self, blocks: int = 1):
+        self.block_number += blocks
+
+    def emit(self, pool_address: str, name: str, indexed: list, values: list, block_number: int = None):
+        """Appends a log of event name of the pool, mined in the next block unless block_number is given.
+
+        indexed are the indexed addresses, values the other arguments.
+        """
+        topic, item = EVENTS[name]
+        data_types = [arg['type'] for arg in item['inputs'] if not arg['indexed']]
+        block_number = self.block_number + 1 if block_number is None else block_number
+        with self.lock:
+            log_index = len(self.logs)
+            self.logs.append({
+                'address': to_checksum_address(pool_address), 'topics': [topic] + ['0x%064x' % int(address, 16) for address in indexed],
+                'data': '0x' + encode_abi(data_types, values).hex(), 'blockNumber': hex(block_number),
+                'blockHash': '0x%064x' % block_number, 'logIndex': hex(log_index), 'transactionHash': '0x%064x' % (log_index + 1),
+                'transactionIndex': '0x0', 'removed': False,
+            })
+
+    def trade(self, pool_address: str, trader: str, position: int, cash: int):
+        """Sets the account of trader, in wad, and emits a Trade event."""
+        pool = self.pools[pool_address.lower()]
+        trader = to_checksum_address(trader)
+        with self.lock:
+            last_position = pool.accounts.get(trader, (0, 0))[0]
+            pool.set_account(trader, position, cash)
+        self.emit(pool.address, 'Trade', [trader], [0, position - last_position, pool.mark_price, 0, 0])
+
+    def _get_logs(self, log_filter: dict) -> list:
+        def block(value, default):
+            if value is None or value == 'latest':
+                return default
+            return int(value, 16) if isinstance(value, str) else value
+        from_block = block(log_filter.get('fromBlock'), self.block_number)
+        to_block = min(block(log_filter.get('toBlock'), self.block_number), self.block_number)
+        addresses = log_filter.get('address')
+        if addresses is not None:
+            addresses = set(address.lower() for address in ([addresses] if isinstance(addresses, str) else addresses))
+        topics = (log_filter.get('topics') or [None])[0]
+        if isinstance(topics, str):
+            topics = [topics]
+        with self.lock:
+            logs = list(self.logs)
+        return [log for log in logs if from_block <= int(log['blockNumber'], 16) <= to_block
+                and (addresses is None or log['address'].lower() in addresses)
+                and (topics is None or log['topics'][0] in topics)]
+
+    def reset_stats(self):
+        with self.lock:
+            self.calls = {}
+            self.http_requests = 0
+
+    def _count(self, name):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _call(self, to: str, data: str) -> str:
+        name, input_types, output_types = FUNCTIONS[bytes.fromhex(data[2:10])]
+        args = decode_abi(input_types, bytes.fromhex(data[10:]))
+        self._count(name)
+        if name == 'aggregate':
+            result = [self.block_number, [bytes.fromhex(self._call(target, '0x' + call_data.hex())[2:]) for target, call_data in args[0]]]
+        elif name == 'getAccountsInfo':
+            pool = self.pools[args[0].lower()]
+            if self.max_page_size is not None and args[3] - args[2] > self.max_page_size:
+                raise ValueError("out of gas")
+            accounts = [(trader,) + pool.margin(trader) for trader in pool.traders[args[2]:args[3]]]
+            result = [True, accounts]
+        else:
+            pool = self.pools[to.lower()]
+            if name == 'getActiveAccountCount':
+                result = [len(pool.traders)]
+            elif name == 'getPerpetualInfo':
+                nums = [0] * 36
+                nums[1] = pool.mark_price
+                nums[6] = MAINTENANCE_MARGIN_RATE
+                result = [2, '0x' + '0' * 40, nums]
+            elif name == 'getMarginAccount':
+                position, margin, is_safe = pool.margin(to_checksum_address(args[1]))
+                cash = pool.accounts.get(to_checksum_address(args[1]), (0, 0))[1]
+                result = [cash, position, margin, margin, margin, True, is_safe, True]
+            elif name == 'liquidateByAMM':
+                result = [0]
+            else:
+                raise ValueError(f"unsupported function {name}")
+        return '0x' + encode_abi(output_types, result).hex()
+
+    def _send_raw_transaction(self, raw: str) -> str:
+        # legacy transaction: nonce, gasPrice, gas, to, value, data, v, r, s
+        tx = rlp.decode(bytes.fromhex(raw[2:]))
+        pool = self.pools['0x' + tx[3].hex()]
+        trader = to_checksum_address(tx[5][4 + 32 + 12:4 + 64])
+        tx_hash = '0x' + hashlib.sha256(bytes.fromhex(raw[2:])).hexdigest()
+        if int.from_bytes(tx[1], 'big') < self.base_fee:
+            return tx_hash
+        with self.lock:
+            # first arrival, transactions may be broadcast to several endpoints
+            self.liquidations.setdefault((pool.address, trader), time.time())
+            self.receipts[tx_hash] = self.block_number
+            account = pool.accounts.get(trader)
+            pool.liquidate(trader)
+        if account is not None:
+            # the pool takes the position as liquidator
+            self.emit(pool.address, 'Liquidate', [pool.address, trader], [0, account[0], pool.mark_price, 0, 0])
+        return tx_hash
+
+    def _estimate_gas(self, tx: dict) -> str:
+        pool = self.pools.get(tx['to'].lower())
+        if pool is not None and tx['data'][2:10] == LiquidityPool.liquidate_by_amm.selector.hex():
+            trader = to_checksum_address('0x' + tx['data'][-40:])
+            if trader not in pool.accounts or pool.margin(trader)[2]:
+                raise ValueError("execution reverted: trader is safe")
+        return hex(300000)
+
+    def _receipt(self, tx_hash: str):
+        block_number = self.receipts.get(tx_hash)
+        if block_number is None:
+            return None
+        return {
+            'transactionHash': tx_hash, 'transactionIndex': '0x0', 'blockNumber': hex(block_number), 'blockHash': '0x' + '0' * 64,
+            'from': '0x' + '0' * 40, 'to': '0x' + '0' * 40, 'cumulativeGasUsed': '0x1', 'gasUsed': '0x1',
+            'contractAddress': None, 'logs': [], 'logsBloom': '0x' + '0' * 512, 'status': '0x1',
+        }
+
+    def handle(self, request: dict) -> dict:
+        method = request['method']
+        params = request.get('params', [])
+        self._count(method)
+        response = {'jsonrpc': '2.0', 'id': request.get('id')}
+        if self.error_rate > 0 and self.random.random() < self.error_rate:
+            response['error'] = {'code': -32000, 'message': 'injected error'}
+            return response
+        try:
+            if method == 'eth_blockNumber':
+                result = hex(self.block_number)
+            elif method == 'eth_getBlockByNumber':
+                result = {'number': hex(self.block_number), 'hash': '0x%064x' % self.block_number,
+                          'parentHash': '0x%064x' % (self.block_number - 1), 'timestamp': hex(int(time.time())), 'transactions': []}
+            elif method == 'eth_call':
+                result = self._call(params[0]['to'], params[0]['data'])
+            elif method == 'eth_getLogs':
+                result = self._get_logs(params[0])
+            elif method == 'web3_clientVersion':
+                result = 'MockNode/v1'
+            elif method == 'eth_chainId':
+                result = '0x1'
+            elif method == 'eth_gasPrice':
+                result = hex(self.base_fee)
+            elif method == 'eth_feeHistory':
+                blocks = int(params[0], 16)
+                result = {'oldestBlock': hex(self.block_number - blocks + 1), 'baseFeePerGas': [hex(self.base_fee)] * (blocks + 1),
+                          'gasUsedRatio': [0.5] * blocks, 'reward': [[hex(10**8)] for _ in range(blocks)]}
+            elif method == 'eth_estimateGas':
+                result = self._estimate_gas(params[0])
+            elif method == 'eth_getTransactionCount':
+                result = '0x0'
+            elif method == 'eth_sendRawTransaction':
+                result = self._send_raw_transaction(params[0])
+            elif method == 'eth_getTransactionReceipt':
+                result = self._receipt(params[0])
+            else:
+                response['error'] = {'code': -32601, 'message': f"method {method} not supported"}
+                return response
+        except Exception as e:
+            response['error'] = {'code': -32000, 'message': str(e)}
+            return response
+        response['result'] = result
+        return response
+
+    def start(self, port: int = 0):
+        self.server = self._serve(port, None)
+        return self
+
+    def add_endpoint(self, latency: float = None, port: int = 0) -> str:
+        """Serves the node on another port with its own latency, returns the url."""
+        server = self._serve(port, latency)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    def _serve(self, port: int, latency: float):
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                # headers and body go out as separate writes, do not let them wait on delayed acks
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with node.lock:
+                    node.http_requests += 1
+                    stalled = node.stall_rate > 0 and node.random.random() < node.stall_rate
+                delay = (node.latency if latency is None else latency) + (node.stall if stalled else 0)
+                if delay > 0:
+                    time.sleep(delay)
+                if isinstance(body, list):
+                    response = [node.handle(request) for request in body]
+                else:
+                    response = node.handle(body)
+                data = json.dumps(response).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.servers.append(server)
+        return server
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="local JSON-RPC stand-in for MCDEX pools")
+    parser.add_argument('--port', type=int, default=8545)
+    parser.add_argument('--pools', type=int, default=10)
+    parser.add_argument('--accounts', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0, help="seconds added to every http request")
+    parser.add_argument('--error-rate', type=float, default=0, help="share of requests answered with an error")
+    parser.add_argument('--max-page-size', type=int, default=None, help="larger getAccountsInfo pages fail")
+    parser.add_argument('--block-time', type=float, default=1, help="seconds between mined blocks")
+    args = parser.parse_args()
+
+    node = MockNode(args.pools, args.accounts, args.latency, args.error_rate, max_page_size=args.max_page_size).start(args.port)
+    print(f"mock node on {node.url}")
+    print(f"READER_ADDRESS={READER_ADDRESS} MULTICALL_ADDRESS={MULTICALL_ADDRESS}")
+    print(f"PERPETUAL_LIST='{json.dumps(node.perpetuals)}'")
+    while True:
+        time.sleep(args.block_time)
+        node.mine()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Replays an RPC recording through Keeper and Watcher, block by block, as fast as the keeper runs.
+
+    RPC_RECORD_PATH=crash.jsonl.gz python main.py     # record
+    python -m benchmark.replay crash.jsonl.gz           # replay
+
+Perpetuals are taken from the same PERPETUAL_LIST as the recording, the graph
+is not replayed. For every account seen unsafe in the recorded
+getAccountsInfo and getMarginAccount responses, or liquidated by the recorded
+keeper, reports the blocks from the first block it was seen unsafe to the
+first liquidation sent in the recording and in the replay. Risk tiers and
+other intervals still run on the wall clock, so they fire less often than in
+the recording. The config package must be importable, settings are given
+through the environment before it is loaded.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import rlp
+from eth_abi import decode_abi
+from hexbytes import HexBytes
+
+from lib.rpc_record import ReplayProvider, read_records
+
+# any key works, nothing is sent
+KEEPER_KEY = '0x' + '11' * 32
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def liquidated_account(raw: str):
+    """(pool, trader) of a liquidateByAMM transaction, as lowercase hex."""
+    # legacy transaction: nonce, gasPrice, gas, to, value, data, v, r, s
+    tx = rlp.decode(HexBytes(raw))
+    return '0x' + tx[3].hex(), '0x' + tx[5][4 + 32 + 12:4 + 64].hex()
+
+
+def recorded_liquidations(path: str) -> tuple:
+    """First block each (pool, trader) was seen unsafe and was liquidated in the recording."""
+    from contract.liquidity_pool import LiquidityPool
+    from contract.reader import Reader
+    accounts_info = Reader.get_accounts_info
+    margin_account = LiquidityPool.get_margin_account
+    unsafe = {}
+    sent = {}
+    for record in read_records(path):
+        block_number = record.get('b')
+        if block_number is None or 'r' not in record:
+            continue
+        if record['m'] == 'eth_sendRawTransaction':
+            sent.setdefault(liquidated_account(record['p'][0]), block_number)
+            continue
+        if record['m'] != 'eth_call':
+            continue
+        data = HexBytes(record['p'][0]['data'])
+        if data[:4] == accounts_info.selector:
+            pool = decode_abi(accounts_info.input_types, data[4:])[0]
+            for account in accounts_info.decode(HexBytes(record['r']))[1]:
+                if not account[3]:
+                    unsafe.setdefault((pool.lower(), account[0].lower()), block_number)
+        elif data[:4] == margin_account.selector:
+            trader = decode_abi(margin_account.input_types, data[4:])[1]
+            if not margin_account.decode(HexBytes(record['r']))[6]:
+                unsafe.setdefault((record['p'][0]['to'].lower(), trader.lower()), block_number)
+    return unsafe, sent
+
+
+def wait_sent(submitter, timeout: float):
+    """Waits until every queued liquidation is sent or dropped."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with submitter.lock:
+            in_flight = any(liquidation.tx_hash is None for liquidation in submitter.liquidations.values())
+        if not in_flight and submitter.queue.empty():
+            return
+        time.sleep(0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="replay an rpc recording through the keeper")
+    parser.add_argument('path', help="recording written with RPC_RECORD_PATH")
+    parser.add_argument('--verbose', action='store_true', help="keep keeper logs")
+    parser.add_argument('--detail', action='store_true', help="print every liquidation")
+    args = parser.parse_args()
+
+    key_file = tempfile.NamedTemporaryFile('w', suffix='.key', delete=False)
+    key_file.write(KEEPER_KEY)
+    key_file.close()
+    os.environ.update({
+        'KEEPER_KEY': key_file.name,
+        'IS_USE_WHITELIST': '1',
+        'SNAPSHOT_PATH': '',
+        'SHARD_COORDINATOR': '',
+        'METRICS_PORT': '0',
+        'RPC_RECORD_PATH': '',
+        'RECEIPT_POLL_INTERVAL': '0.01',
+    })
+
+    import config
+    # console only, the file handler needs ./log
+    config.LOG_CONFIG['handlers'] = {'console': config.LOG_CONFIG['handlers']['console']}
+    config.LOG_CONFIG['root'] = {'level': 'INFO' if args.verbose else 'WARNING', 'handlers': ['console']}
+    from keeper import Keeper
+
+    load_start = time.perf_counter()
+    replay = ReplayProvider(args.path)
+    blocks = replay.block_numbers()
+    if len(blocks) == 0:
+        print("no blocks in the recording")
+        sys.exit(1)
+    print(f"recording:{args.path} blocks:{blocks[0]}-{blocks[-1]} ({len(blocks)} seen) load:{time.perf_counter() - load_start:.1f}s")
+
+    keeper = Keeper([])
+    keeper.web3.provider = replay
+    replay.block_number = blocks[0]
+    if not keeper._check_keeper_account():
+        sys.exit(1)
+    keeper._set_liquidity_pools()
+    keeper.submitter.start()
+    keeper.watcher.add_block_syncer(keeper._check_all_perpetuals)
+
+    start = time.perf_counter()
+    for block_number in blocks:
+        replay.block_number = block_number
+        keeper.watcher._poll_block()
+        for block_syncer in keeper.watcher.block_syncers:
+            block_syncer.wait()
+        wait_sent(keeper.submitter, 60)
+    elapsed = time.perf_counter() - start
+    print(f"replayed {len(blocks)} blocks in {elapsed:.1f}s, {elapsed / len(blocks) * 1e3:.1f}ms per block")
+
+    unsafe, recorded = recorded_liquidations(args.path)
+    replayed = {}
+    for block_number, raw in replay.sent:
+        replayed.setdefault(liquidated_account(raw), block_number)
+
+    recorded_lags = []
+    replayed_lags = []
+    missed = 0
+    for account in sorted(set(unsafe) | set(recorded), key=lambda account: unsafe.get(account, recorded.get(account))):
+        first = min(block for block in (unsafe.get(account), recorded.get(account)) if block is not None)
+        if account in recorded:
+            recorded_lags.append(recorded[account] - first)
+        if account in replayed:
+            replayed_lags.append(replayed[account] - first)
+        else:
+            missed += 1
+        if args.detail:
+            print(f"pool:{account[0]} trader:{account[1]} unsafe:{first} recorded:{recorded.get(account, '-')} replay:{replayed.get(account, '-')}")
+
+    print(f"liquidations:{len(set(unsafe) | set(recorded))} recorded sent:{len(recorded_lags)} replay sent:{len(replayed_lags)} replay missed:{missed}")
+    for title, lags in (("recorded", recorded_lags), ("replay", replayed_lags)):
+        if len(lags) > 0:
+            print(f"{title:<9} blocks from unsafe to send p50:{percentile(lags, 0.5)} p90:{percentile(lags, 0.9)} max:{max(lags)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,127 @@
 import os
 
-# eth node rpc request
+# eth node rpc request, several endpoints separated by commas. reads go to the fastest healthy
+# endpoint and are sent to the next one if not answered within the p95 latency of the first,
+# or RPC_HEDGE_DELAY seconds until it is known. transactions are sent to all endpoints
 ETH_RPC_URL = os.environ.get('ETH_RPC_URL', 'https://kovan5.arbitrum.io/rpc')
+RPC_HEDGE_DELAY = float(os.environ.get('RPC_HEDGE_DELAY', 1))
+# an endpoint failing RPC_MAX_FAILURES times in a row is not used for RPC_COOLDOWN seconds
+RPC_MAX_FAILURES = int(os.environ.get('RPC_MAX_FAILURES', 3))
+RPC_COOLDOWN = float(os.environ.get('RPC_COOLDOWN', 30))
+# append every rpc request and response to RPC_RECORD_PATH(.gz for gzip) to replay with
+# python -m benchmark.replay, disabled if empty
+RPC_RECORD_PATH = os.environ.get('RPC_RECORD_PATH', '')
+
+# max in-flight requests to each eth node
+RPC_CONCURRENCY = int(os.environ.get('RPC_CONCURRENCY', 16))
+# max perpetuals checked at the same time, and of those max perpetuals of the same pool
+SCAN_CONCURRENCY = int(os.environ.get('SCAN_CONCURRENCY', 16))
+POOL_CONCURRENCY = int(os.environ.get('POOL_CONCURRENCY', 4))
+# timeout for checking one perpetual in a cycle(second)
+PERPETUAL_TIMEOUT = int(os.environ.get('PERPETUAL_TIMEOUT', 60))
+
+# "block" checks perpetuals on each new block polled every BLOCK_POLL_INTERVAL seconds,
+# "interval" checks perpetuals every WATCH_INTERVAL seconds
+WATCH_MODE = os.environ.get('WATCH_MODE', 'block')
+BLOCK_POLL_INTERVAL = float(os.environ.get('BLOCK_POLL_INTERVAL', 0.5))
+WATCH_INTERVAL = float(os.environ.get('WATCH_INTERVAL', 20))
 
 # timeout for get transaction receipt(second)
 TX_TIMEOUT = os.environ.get('TX_TIMEOUT', 300)
 KEEPER_KEY = os.environ.get('KEEPER_KEY', './key_file')
+# interval for polling receipts of sent transactions(second)
+RECEIPT_POLL_INTERVAL = float(os.environ.get('RECEIPT_POLL_INTERVAL', 1))
+
+# warm-start snapshot of perpetuals, account indexes and pending transactions,
+# written every SNAPSHOT_INTERVAL seconds, disabled if SNAPSHOT_PATH is empty
+SNAPSHOT_PATH = os.environ.get('SNAPSHOT_PATH', '')
+SNAPSHOT_INTERVAL = int(os.environ.get('SNAPSHOT_INTERVAL', 60))
+
+# split perpetuals by consistent hashing between keepers sharing the SHARD_COORDINATOR sqlite file,
+# disabled if empty. SHARD_WORKERS > 1 runs that many keeper processes on this host, using
+# ./shard/coordinator.db if no coordinator is set. SHARD_ID defaults to host-pid, or host-worker
+SHARD_COORDINATOR = os.environ.get('SHARD_COORDINATOR', '')
+SHARD_ID = os.environ.get('SHARD_ID', '')
+SHARD_WORKERS = int(os.environ.get('SHARD_WORKERS', 1))
+# a keeper not renewing its lease for SHARD_LEASE_TTL seconds loses its perpetuals to the others
+SHARD_LEASE_TTL = float(os.environ.get('SHARD_LEASE_TTL', 30))
+# a liquidation claimed by one keeper is not sent by others for LIQUIDATION_CLAIM_TTL seconds
+LIQUIDATION_CLAIM_TTL = float(os.environ.get('LIQUIDATION_CLAIM_TTL', 300))
+
+# prometheus metrics on http://METRICS_ADDR:METRICS_PORT/metrics, disabled if port is 0
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 9108))
+METRICS_ADDR = os.environ.get('METRICS_ADDR', '127.0.0.1')
+# /ready answers 200 after the first check of all perpetuals, /health while the last one ended
+# less than HEALTH_MAX_SWEEP_AGE seconds ago, both on the metrics port
+HEALTH_MAX_SWEEP_AGE = float(os.environ.get('HEALTH_MAX_SWEEP_AGE', 120))
+# sample stacks of all threads every PROFILE_INTERVAL seconds while perpetuals are checked,
+# collapsed stacks are written to PROFILE_PATH, disabled if empty
+PROFILE_PATH = os.environ.get('PROFILE_PATH', '')
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.005))
 
-# gas price
+# gas price in gwei, used when the node returns no fee data. liquidations are priced from
+# eth_feeHistory, base fee of the next block plus the GAS_PRICE_PERCENTILE priority fee,
+# and never above MAX_GAS_PRICE
 GAS_PRICE = os.environ.get('GAS_PRICE', 1)
+MAX_GAS_PRICE = os.environ.get('MAX_GAS_PRICE', 200)
+GAS_PRICE_PERCENTILE = float(os.environ.get('GAS_PRICE_PERCENTILE', 60))
+# a liquidation not mined in GAS_REPLACE_INTERVAL seconds is sent again with the same nonce
+# and GAS_BUMP more gas price, at most MAX_REPLACEMENTS times
+GAS_REPLACE_INTERVAL = float(os.environ.get('GAS_REPLACE_INTERVAL', 15))
+GAS_BUMP = float(os.environ.get('GAS_BUMP', 0.125))
+MAX_REPLACEMENTS = int(os.environ.get('MAX_REPLACEMENTS', 5))
+# ETH per collateral unit, to keep the gas cost of a liquidation under the keeper gas reward.
+# no cap if 0
+GAS_REWARD_RATE = float(os.environ.get('GAS_REWARD_RATE', 0))
+# gas limit of a liquidation is its estimate times GAS_LIMIT_MARGIN, state moves until it is mined
+GAS_LIMIT_MARGIN = float(os.environ.get('GAS_LIMIT_MARGIN', 1.2))
 
 # contract address
+# initial accounts per getAccountsInfo call, then learned per endpoint and perpetual between
+# MIN_PAGE_SIZE and MAX_PAGE_SIZE, backing off when a call fails or takes over PAGE_TARGET_SECONDS
 MAX_NUM = int(os.environ.get('MAX_NUM', 100))
+MIN_PAGE_SIZE = int(os.environ.get('MIN_PAGE_SIZE', 10))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 2000))
+PAGE_TARGET_SECONDS = float(os.environ.get('PAGE_TARGET_SECONDS', 2))
+# a full sync fetches PAGES_PER_FETCH pages per request, with PREFETCH_DEPTH requests in flight
+# while the accounts already fetched are checked and liquidated
+PAGES_PER_FETCH = int(os.environ.get('PAGES_PER_FETCH', 10))
+PREFETCH_DEPTH = int(os.environ.get('PREFETCH_DEPTH', 2))
+# full account resync interval(second), accounts are updated from pool events in between
+ACCOUNT_RESYNC_INTERVAL = int(os.environ.get('ACCOUNT_RESYNC_INTERVAL', 600))
+# re-check accounts onchain by margin headroom(margin / maintenance margin - 1),
+# as [[max headroom, interval(second)], ...]. 0 means every block, above the last tier only full resync
+RISK_TIERS = os.environ.get('RISK_TIERS', '[[0.1, 0], [0.3, 30], [1, 180]]')
+# perpetuals not in normal state are not swept. a perpetual whose last sweep found no unsafe
+# account is skipped while its price, funding, margin rate and accounts are unchanged, but swept
+# at least every PERPETUAL_MAX_IDLE seconds. 0 sweeps every perpetual on every cycle
+PERPETUAL_MAX_IDLE = float(os.environ.get('PERPETUAL_MAX_IDLE', 60))
+# max block gap to catch up from events, a larger gap triggers a full resync
+MAX_LOG_BLOCK_RANGE = int(os.environ.get('MAX_LOG_BLOCK_RANGE', 5000))
 IS_USE_WHITELIST = os.environ.get('IS_USE_WHITELIST', False)
 PERPETUAL_LIST = os.environ.get('PERPETUAL_LIST', '["0xFE62314f9FB010BEBF52808cD5A4c571a47c4c46-0", "0x1Ef9Db1C1EAF2240DA2a78e581d53b9e833295BE-0"]')
 # notice lowercase
 POOL_BLACK_LIST = os.environ.get('POOL_BLACK_LIST', '["0xfe62314f9fb010bebf52808cd5a4c571a47c4c46"]')
 READER_ADDRESS = os.environ.get('READER_ADDRESS', '0x50DD9E7d582F13637137F8bDD8357E0b6b5f6B5B')
+# bundle contract calls through a multicall contract, json-rpc batch requests are used if empty
+MULTICALL_ADDRESS = os.environ.get('MULTICALL_ADDRESS', '')
+# max calls in one json-rpc batch request or multicall
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 100))
 IS_TAKE_OVER = os.environ.get('IS_TAKE_OVER', False)
 
 # mcdex perpetual graph
 GRAPH_URL = os.environ.get('GRAPH_URL', 'https://api.thegraph.com/subgraphs/name/mcdexio/mcdex3-kovan1')
+# perpetual list from graph is refreshed in background every DISCOVERY_TTL seconds,
+# known pools are watched for perpetual create/state events every DISCOVERY_EVENT_INTERVAL seconds
+DISCOVERY_TTL = int(os.environ.get('DISCOVERY_TTL', 300))
+DISCOVERY_EVENT_INTERVAL = int(os.environ.get('DISCOVERY_EVENT_INTERVAL', 15))
 
+# log records are written by a background thread, records under WARNING are dropped when
+# LOG_QUEUE_SIZE records are waiting. every perpetual check logs one summary, accounts are only
+# logged within LOG_RISK_HEADROOM of their maintenance margin or as a LOG_SAMPLE_RATE sample
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+LOG_RISK_HEADROOM = float(os.environ.get('LOG_RISK_HEADROOM', 0.1))
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 0.001))
 LOG_CONFIG = {
     "version": 1,
     "disable_existing_loggers": True,
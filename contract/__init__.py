@@ -1,2 +1,3 @@
 from .liquidity_pool import LiquidityPool
 from .reader import Reader
+from .multicall import Multicall
@@ -1,9 +1,12 @@
 from web3 import Web3
 import logging
 
+from lib.abi_cache import event_topics
 from lib.address import Address
 from lib.contract import Contract
+from lib.fast_call import FastCall, FastFunction
 from lib.wad import Wad
+from contract.reader import MarginAccount
 from enum import Enum
 
 class Status(Enum):
@@ -13,6 +16,11 @@ class Status(Enum):
      EMERGENCY = 3
      CLEARED = 4
 
+# events that change the margin account of the traders in topics
+ACCOUNT_EVENTS = ['Trade', 'Deposit', 'Withdraw', 'Liquidate', 'Settle']
+# events that create a perpetual or change its state
+PERPETUAL_EVENTS = ['CreatePerpetual', 'SetNormalState', 'SetEmergencyState', 'SetClearedState']
+
 class Liquidate:
     def __init__(self, price: int, amount: int):
         assert(isinstance(price, int))
@@ -21,9 +29,27 @@ class Liquidate:
         self.price = Wad(price)
         self.amount = Wad(amount)
 
+class PerpetualInfo:
+    def __init__(self, state: int, oracle: str, nums: list):
+        assert(isinstance(state, int))
+
+        self.status = Status(state)
+        self.oracle = oracle
+        self.mark_price = Wad(nums[1])
+        self.unit_accumulative_funding = Wad(nums[4])
+        self.maintenance_margin_rate = Wad(nums[6])
+        self.keeper_gas_reward = Wad(nums[11])
+
 class LiquidityPool(Contract):
     abi = Contract._load_abi(__name__, '../abis/LiquidityPool.abi')
     logger = logging.getLogger()
+    account_event_topics = event_topics(abi, ACCOUNT_EVENTS)
+    perpetual_event_topics = event_topics(abi, PERPETUAL_EVENTS)
+    # hot functions skip the web3 contract machinery
+    get_active_account_count = FastFunction(abi, 'getActiveAccountCount')
+    get_perpetual_info = FastFunction(abi, 'getPerpetualInfo')
+    get_margin_account = FastFunction(abi, 'getMarginAccount')
+    liquidate_by_amm = FastFunction(abi, 'liquidateByAMM')
 
     def __init__(self, web3: Web3, address: Address):
         assert(isinstance(web3, Web3))
@@ -31,23 +57,65 @@ class LiquidityPool(Contract):
 
         self.web3 = web3
         self.address = address
-        self.contract = self._get_contract(web3, self.abi, address)
 
     def getPerpetualCount(self):
         pool_info = self.contract.functions.getLiquidityPoolInfo().call()
         return pool_info[4][1]
 
+    def accounts_count_call(self, perpetual_index) -> FastCall:
+        return self.get_active_account_count(self.address.address, perpetual_index)
+
     def accounts_count(self, perpetual_index) -> int:
-        return self.contract.functions.getActiveAccountCount(perpetual_index).call()
+        return self.accounts_count_call(perpetual_index).call(self.web3)
+
+    def perpetual_info_call(self, perpetual_index) -> FastCall:
+        return self.get_perpetual_info(self.address.address, perpetual_index)
+
+    def perpetual_info(self, perpetual_index) -> PerpetualInfo:
+        return self.parse_perpetual_info(self.perpetual_info_call(perpetual_index).call(self.web3))
+
+    @staticmethod
+    def parse_perpetual_info(perp_info) -> PerpetualInfo:
+        return PerpetualInfo(perp_info[0], perp_info[1], perp_info[2])
 
     def perpetual_status(self, perpetual_index) -> Status:
-        perp_info = self.contract.functions.getPerpetualInfo(perpetual_index).call()
-        return Status(perp_info[0])
+        return self.perpetual_info(perpetual_index).status
 
     def accounts(self, perpetual_index, begin: int, end: int):
         accounts = self.contract.functions.listActiveAccounts(perpetual_index, begin, end).call()
         return accounts
 
+    def margin_account_call(self, perpetual_index, trader: bytes) -> FastCall:
+        return self.get_margin_account(self.address.address, perpetual_index, trader)
+
+    def margin_account(self, perpetual_index, trader: bytes) -> MarginAccount:
+        return self.parse_margin_account(trader, self.margin_account_call(perpetual_index, trader).call(self.web3))
+
+    @staticmethod
+    def parse_margin_account(trader: bytes, account) -> MarginAccount:
+        # cash, position, availableMargin, margin, settleableMargin, isInitialMarginSafe, isMaintenanceMarginSafe, isMarginSafe
+        return MarginAccount(trader, account[1], account[3], account[6])
+
+    def touched_accounts(self, perpetual_index, from_block: int, to_block: int) -> set:
+        """Returns the 20-byte addresses of traders touched by account events in the block range."""
+        logs = self.web3.eth.getLogs({
+            'address': self.address.address,
+            'fromBlock': from_block,
+            'toBlock': to_block,
+            'topics': [list(self.account_event_topics.keys())],
+        })
+        traders = set()
+        for log in logs:
+            # perpetualIndex is the first non-indexed argument of all account events
+            if int(log['data'][2:66], 16) != perpetual_index:
+                continue
+            # Liquidate changes both the liquidator and the trader
+            for topic in log['topics'][1:]:
+                traders.add(bytes(topic[-20:]))
+        return traders
+
+    def liquidate_by_amm_call(self, perpetual_index, trader: bytes) -> FastCall:
+        return self.liquidate_by_amm(self.address.address, perpetual_index, trader)
 
     def liquidateByAMM(self, perpetual_index, trader, user, gas_price):
         # gas = self.contract.functions.liquidateByAMM(perpetual_index, trader).estimateGas({
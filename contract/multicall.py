@@ -0,0 +1,22 @@
+from web3 import Web3
+
+from lib.address import Address
+from lib.contract import Contract
+from lib.fast_call import FastFunction
+
+
+class Multicall(Contract):
+    abi = Contract._load_abi(__name__, '../abis/Multicall.abi')
+    aggregate_function = FastFunction(abi, 'aggregate')
+
+    def __init__(self, web3: Web3, address: Address):
+        assert(isinstance(web3, Web3))
+        assert(isinstance(address, Address))
+
+        self.web3 = web3
+        self.address = address
+
+    def aggregate(self, calls: list) -> list:
+        """Make FastCalls in one eth_call, returns the decoded results."""
+        block_number, return_data = self.aggregate_function(self.address.address, [(call.address, call.data) for call in calls]).call(self.web3)
+        return [call.decode(data) for call, data in zip(calls, return_data)]
@@ -2,18 +2,58 @@ from web3 import Web3
 
 from lib.address import Address
 from lib.contract import Contract
+from lib.fast_call import FastCall, FastFunction
 from lib.wad import Wad
 
 class MarginAccount():
-    def __init__(self, address, position: int, margin: int, is_safe: bool):
+    __slots__ = ('address', 'position', 'margin', 'is_safe')
+
+    def __init__(self, address: bytes, position: int, margin: int, is_safe: bool):
         self.address = address
         self.position = Wad(position)
         self.margin = Wad(margin)
         self.is_safe = is_safe
 
 
+class AccountBatch():
+    """Margin accounts as columns, addresses are 20-byte values and positions and margins are ints.
+
+    MarginAccount objects are only created when iterating the batch.
+    """
+    __slots__ = ('addresses', 'positions', 'margins', 'is_safe')
+
+    def __init__(self):
+        self.addresses = []
+        self.positions = []
+        self.margins = []
+        self.is_safe = []
+
+    def append(self, address: bytes, position: int, margin: int, is_safe: bool):
+        self.addresses.append(address)
+        self.positions.append(position)
+        self.margins.append(margin)
+        self.is_safe.append(is_safe)
+
+    def extend(self, other):
+        self.addresses += other.addresses
+        self.positions += other.positions
+        self.margins += other.margins
+        self.is_safe += other.is_safe
+
+    def unsafe_addresses(self) -> list:
+        return [address for address, is_safe in zip(self.addresses, self.is_safe) if not is_safe]
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def __iter__(self):
+        for i in range(len(self.addresses)):
+            yield MarginAccount(self.addresses[i], self.positions[i], self.margins[i], self.is_safe[i])
+
+
 class Reader(Contract):
     abi = Contract._load_abi(__name__, '../abis/Reader.abi')
+    get_accounts_info = FastFunction(abi, 'getAccountsInfo')
 
     def __init__(self, web3: Web3, address: Address):
         assert(isinstance(web3, Web3))
@@ -21,11 +61,17 @@ class Reader(Contract):
 
         self.web3 = web3
         self.address = address
-        self.contract = self._get_contract(web3, self.abi, address)
 
-    def getAccountsInfo(self, pool_address, perpetual_index, begin, end) -> []:
-        accountsInfo = self.contract.functions.getAccountsInfo(pool_address, perpetual_index, begin, end).call()
-        res = []
+    def accounts_info_call(self, pool_address, perpetual_index, begin, end) -> FastCall:
+        return self.get_accounts_info(self.address.address, pool_address, perpetual_index, begin, end)
+
+    def getAccountsInfo(self, pool_address, perpetual_index, begin, end) -> AccountBatch:
+        accountsInfo = self.accounts_info_call(pool_address, perpetual_index, begin, end).call(self.web3)
+        return self.parse_accounts_info(accountsInfo)
+
+    @staticmethod
+    def parse_accounts_info(accountsInfo) -> AccountBatch:
+        res = AccountBatch()
         for account in accountsInfo[1]:
-            res.append(MarginAccount(account[0], account[1], account[2], account[3]))
+            res.append(bytes.fromhex(account[0][2:]), account[1], account[2], account[3])
         return res
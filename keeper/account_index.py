@@ -0,0 +1,186 @@
+import logging
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+import config
+from lib.batch_call import BatchCaller
+from lib.wad import Wad
+from contract.liquidity_pool import LiquidityPool, PerpetualInfo
+from contract.reader import AccountBatch, Reader
+from .margin_engine import MarginEngine
+from .liquidation_index import LiquidationPriceIndex
+from .page_sizer import PageSizer
+
+
+class AccountIndex:
+    """Margin accounts of one perpetual, kept current from pool account events.
+
+    Price moves change safety without emitting events, so accounts are also
+    re-checked by margin headroom and the index is still fully resynced every
+    ACCOUNT_RESYNC_INTERVAL seconds.
+    """
+    logger = logging.getLogger()
+
+    def __init__(self, pool: LiquidityPool, perpetual_index: int, batch_caller: BatchCaller, page_sizer: PageSizer, executor=None):
+        assert(isinstance(pool, LiquidityPool))
+        assert(isinstance(batch_caller, BatchCaller))
+        assert(isinstance(page_sizer, PageSizer))
+
+        self.pool = pool
+        self.perpetual_index = perpetual_index
+        self.batch_caller = batch_caller
+        self.page_sizer = page_sizer
+        # runs page fetches ahead of the caller, fetched inline if None
+        self.executor = executor
+        # page sizes are learned per endpoint and perpetual
+        self.page_key = (getattr(batch_caller.web3.provider, 'endpoint_uri', None), pool.address.address, perpetual_index)
+        # last block whose events have been applied
+        self.block_number = None
+        self.synced_at = None
+        # traders to re-fetch on next update
+        self.dirty = set()
+        self.engine = MarginEngine()
+        self.liquidation_index = LiquidationPriceIndex()
+        # perpetual info of the last crossed query
+        self.last_info = None
+
+    def is_stale(self, block_number: int) -> bool:
+        if self.block_number is None or self.synced_at is None:
+            return True
+        if time.time() - self.synced_at >= config.ACCOUNT_RESYNC_INTERVAL:
+            return True
+        return block_number - self.block_number > config.MAX_LOG_BLOCK_RANGE
+
+    def sync(self, reader: Reader, block_number: int, info: PerpetualInfo, count: int):
+        """Bring the index up to block_number, yields the accounts fetched from chain as they arrive."""
+        if self.is_stale(block_number):
+            yield from self.rebuild(reader, block_number, info, count)
+        else:
+            yield self.update(block_number, info)
+
+    def rebuild(self, reader: Reader, block_number: int, info: PerpetualInfo, count: int):
+        """Yields the accounts of every fetch of PAGES_PER_FETCH pages, the engine is reloaded after the last one.
+
+        Up to PREFETCH_DEPTH fetches are in flight on the executor while the
+        caller handles the current one, so at most that many are held in memory
+        besides the engine columns.
+        """
+        traders = []
+        positions = []
+        margins = []
+        for accounts in self._stream_pages(reader, count):
+            traders += accounts.addresses
+            positions.append(np.array(accounts.positions, dtype=np.float64) / 1e18)
+            margins.append(np.array(accounts.margins, dtype=np.float64) / 1e18)
+            yield accounts
+
+        self.block_number = block_number
+        self.synced_at = time.time()
+        self.dirty.clear()
+        self.engine.load_columns(traders, np.concatenate(positions) if len(positions) > 0 else np.zeros(0),
+                                 np.concatenate(margins) if len(margins) > 0 else np.zeros(0), info)
+
+    def _submit(self, fn, *args) -> Future:
+        if self.executor is not None:
+            return self.executor.submit(fn, *args)
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _stream_pages(self, reader: Reader, count: int):
+        page_size = self.page_sizer.size(self.page_key)
+        # (first account, page size, future of the pages)
+        fetches = deque()
+        begin = 0
+        last_page = None
+        try:
+            while True:
+                while len(fetches) < max(1, config.PREFETCH_DEPTH) and begin < count:
+                    end = min(count, begin + page_size * config.PAGES_PER_FETCH)
+                    fetches.append((begin, page_size, self._submit(self._get_pages, reader, begin, end, page_size)))
+                    begin = end
+                if len(fetches) == 0:
+                    break
+                fetch_begin, fetch_size, future = fetches.popleft()
+                try:
+                    pages = future.result()
+                except Exception as e:
+                    # too many accounts per call for the node, fetch again from here with smaller pages
+                    if not self.page_sizer.failure(self.page_key, fetch_size):
+                        raise
+                    page_size = self.page_sizer.size(self.page_key)
+                    self.logger.warning(f"get accounts info error with page size {fetch_size}:{e}, retry with {page_size}")
+                    for _, _, pending in fetches:
+                        pending.cancel()
+                    fetches.clear()
+                    begin = fetch_begin
+                    continue
+                accounts = AccountBatch()
+                for page in pages:
+                    accounts.extend(page)
+                last_page = (len(pages[-1]), fetch_size)
+                yield accounts
+
+            # accounts added after counting show up on trailing pages
+            while last_page is not None and last_page[0] == last_page[1]:
+                pages = self._get_pages(reader, begin, begin + last_page[1], last_page[1])
+                begin += last_page[1]
+                last_page = (len(pages[0]), last_page[1])
+                yield pages[0]
+        finally:
+            for _, _, pending in fetches:
+                pending.cancel()
+
+    def _get_pages(self, reader: Reader, begin: int, end: int, page_size: int) -> list:
+        pool_address = self.pool.address.address
+        start = time.time()
+        # all pages of the range in one batch
+        calls = [reader.accounts_info_call(pool_address, self.perpetual_index, page, page + page_size) for page in range(begin, end, page_size)]
+        pages = [reader.parse_accounts_info(result) for result in self.batch_caller.call(calls)]
+        self.page_sizer.success(self.page_key, page_size, (time.time() - start) / len(pages), len(pages[0]) == page_size)
+        return pages
+
+    def update(self, block_number: int, info: PerpetualInfo) -> AccountBatch:
+        if block_number > self.block_number:
+            self.dirty |= self.pool.touched_accounts(self.perpetual_index, self.block_number + 1, block_number)
+            self.block_number = block_number
+        return self.refresh(list(self.dirty), info)
+
+    def refresh(self, traders: list, info: PerpetualInfo) -> AccountBatch:
+        """Re-reads traders in one batch, those that fail stay dirty for the next update."""
+        accounts = AccountBatch()
+        if len(traders) == 0:
+            return accounts
+        results = self.batch_caller.try_call([self.pool.margin_account_call(self.perpetual_index, trader) for trader in traders])
+        errors = 0
+        for trader, result in zip(traders, results):
+            if isinstance(result, Exception):
+                errors += 1
+                self.dirty.add(trader)
+                continue
+            account = LiquidityPool.parse_margin_account(trader, result)
+            self.dirty.discard(trader)
+            if account.position == Wad(0) and account.margin == Wad(0):
+                self.engine.remove(trader)
+                continue
+            self.engine.set(account, info)
+            accounts.append(trader, account.position.value, account.margin.value, account.is_safe)
+        if errors > 0:
+            self.logger.warning(f"get margin accounts error. perpetual:{self.pool.address}-{self.perpetual_index} failed:{errors}/{len(traders)}")
+        return accounts
+
+    def mark_dirty(self, trader):
+        self.dirty.add(trader)
+
+    def crossed(self, info: PerpetualInfo) -> list:
+        """Returns traders that went unsafe since the last call."""
+        self.liquidation_index.build(self.engine)
+        traders = self.liquidation_index.crossed(self.last_info, info)
+        self.last_info = info
+        return traders
@@ -0,0 +1,84 @@
+import logging
+import threading
+import time
+
+from web3 import Web3
+
+
+class GasStrategy:
+    """Legacy gas price from the fee market instead of a constant.
+
+    eth_feeHistory of the last blocks gives the base fee of the next block and
+    the priority fee paid at percentile. The price covers one full base fee
+    increase (12.5%) plus that priority fee, and is never less than
+    eth_gasPrice, or default_price if that is zero or fails. Nodes without
+    eth_feeHistory fall back to eth_gasPrice, and to default_price if both
+    fail. Fee data is cached for ttl seconds and prices never exceed
+    max_price.
+    """
+    logger = logging.getLogger()
+
+    def __init__(self, web3: Web3, default_price: int, max_price: int, percentile: float, blocks: int = 10, ttl: float = 2):
+        assert(isinstance(web3, Web3))
+        assert(default_price <= max_price)
+
+        self.web3 = web3
+        self.default_price = default_price
+        self.max_price = max_price
+        self.percentile = percentile
+        self.blocks = blocks
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.fee_history = True
+        self.market_price = None
+        self.fetched_at = None
+
+    def _request(self, method, params):
+        response = self.web3.provider.make_request(method, params)
+        if 'error' in response:
+            raise ValueError(response['error'])
+        return response['result']
+
+    def _fetch(self) -> int:
+        if self.fee_history:
+            try:
+                history = self._request('eth_feeHistory', [hex(self.blocks), 'latest', [self.percentile]])
+                # the last base fee is the one of the next block
+                base_fee = int(history['baseFeePerGas'][-1], 16)
+                rewards = sorted(int(reward[0], 16) for reward in history.get('reward') or [] if len(reward) > 0)
+                tip = rewards[len(rewards) // 2] if len(rewards) > 0 else 0
+                # pre-London nodes and some L2s answer zero fees
+                return max(base_fee * 9 // 8 + tip, self._gas_price())
+            except Exception as e:
+                self.logger.warning(f"get fee history error:{e}, use eth_gasPrice")
+                error = e.args[0] if len(e.args) > 0 else None
+                if isinstance(error, dict) and error.get('code') == -32601:
+                    # method not found, do not ask again
+                    self.fee_history = False
+        return int(self._request('eth_gasPrice', []), 16)
+
+    def _gas_price(self) -> int:
+        try:
+            return int(self._request('eth_gasPrice', []), 16) or self.default_price
+        except Exception as e:
+            self.logger.warning(f"get gas price error:{e}")
+            return self.default_price
+
+    def price(self) -> int:
+        with self.lock:
+            if self.fetched_at is None or time.time() - self.fetched_at >= self.ttl:
+                try:
+                    self.market_price = self._fetch()
+                except Exception as e:
+                    self.logger.warning(f"get gas price error:{e}")
+                    self.market_price = None
+                self.fetched_at = time.time()
+            price = self.default_price if self.market_price is None else self.market_price
+        return min(price, self.max_price)
+
+    def bump(self, price: int, ratio: float):
+        """Price to replace a transaction sent at price, None if it is already at max_price."""
+        if price >= self.max_price:
+            return None
+        # nodes reject replacements under a 10% bump
+        return min(self.max_price, max(int(price * (1 + ratio)) + 1, self.price()))
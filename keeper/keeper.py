@@ -2,39 +2,97 @@ import logging
 import logging.config
 import time
 import json
-import requests
-import threading
-import math
+import os
+import random
+import socket
+from concurrent.futures import ThreadPoolExecutor
 
-from web3 import Web3, HTTPProvider, middleware
-import eth_utils
-from eth_utils import encode_hex
+from web3 import Web3
 from eth_account import Account
+from hexbytes import HexBytes
 from web3.middleware import construct_sign_and_send_raw_middleware, geth_poa_middleware
 
 import config
 from lib.address import Address
+from lib.batch_call import BatchCaller
+from lib.log import configure_logging
+from lib.metrics import start_http_server
+from lib.provider import MultiHTTPProvider, PooledHTTPProvider
 from lib.wad import Wad
 from watcher import Watcher
-from contract.liquidity_pool import LiquidityPool, Status
-from contract.reader import Reader, MarginAccount
+from contract.liquidity_pool import LiquidityPool
+from contract.multicall import Multicall
+from contract.reader import AccountBatch, Reader
+from .account_index import AccountIndex
+from .gas_strategy import GasStrategy
+from .metrics import ACCOUNTS_SCANNED, CYCLE_SECONDS, FIRST_SWEEP_SECONDS, PAGE_SIZE, PERPETUAL_CHECK_SECONDS, UNSAFE_ACCOUNTS
+from .page_sizer import PageSizer
+from .perpetual_discovery import PerpetualDiscovery
+from .perpetual_state import PerpetualStates
+from .risk_scheduler import RiskScheduler
+from .scan_engine import ScanEngine
+from .submitter import Liquidation, Submitter
 
 class Keeper:
     logger = logging.getLogger()
 
     def __init__(self, args: list, **kwargs):
-        logging.config.dictConfig(config.LOG_CONFIG)
+        # process start if given, for the time to first sweep
+        self.started_at = kwargs.get('started_at', time.time())
+        self.first_sweep_at = None
+        self.last_sweep_at = None
+        self.last_block_number = None
+        configure_logging(config.LOG_CONFIG, config.LOG_QUEUE_SIZE)
         self.keeper_account = None
+        self.submitter = None
         # self.web3 = Web3(HTTPProvider(endpoint_uri=config.ETH_RPC_URL, request_kwargs={'headers':{"Origin":"mcdex.io"}}))
-        self.web3 = Web3(HTTPProvider(endpoint_uri=config.ETH_RPC_URL))
+        endpoint_uris = [uri.strip() for uri in config.ETH_RPC_URL.split(",") if uri.strip() != ""]
+        if len(endpoint_uris) > 1:
+            provider = MultiHTTPProvider(endpoint_uris, config.RPC_CONCURRENCY, config.RPC_HEDGE_DELAY,
+                                         max_failures=config.RPC_MAX_FAILURES, cooldown=config.RPC_COOLDOWN)
+        else:
+            provider = PooledHTTPProvider(endpoint_uri=config.ETH_RPC_URL, max_connections=config.RPC_CONCURRENCY)
+        # optional features import their modules only when enabled
+        if config.RPC_RECORD_PATH:
+            from lib.rpc_record import RecordingProvider
+            provider = RecordingProvider(provider, config.RPC_RECORD_PATH)
+        self.web3 = Web3(provider)
         self.web3.middleware_onion.inject(geth_poa_middleware, layer=0)
-        self.gas_price = self.web3.toWei(config.GAS_PRICE, "gwei")
+        self.gas_strategy = GasStrategy(self.web3, self.web3.toWei(config.GAS_PRICE, "gwei"),
+                                        self.web3.toWei(config.MAX_GAS_PRICE, "gwei"), config.GAS_PRICE_PERCENTILE)
 
         self.perpetuals = {}
+        # perpetual key -> AccountIndex
+        self.account_indexes = {}
         self.reader = Reader(web3=self.web3, address=Address(config.READER_ADDRESS))
+        multicall = Multicall(web3=self.web3, address=Address(config.MULTICALL_ADDRESS)) if config.MULTICALL_ADDRESS else None
+        self.batch_caller = BatchCaller(self.web3, multicall, config.MAX_BATCH_SIZE)
+
+        # fetches account pages ahead of the perpetual checks
+        self.prefetcher = ThreadPoolExecutor(max_workers=config.SCAN_CONCURRENCY * max(1, config.PREFETCH_DEPTH), thread_name_prefix="prefetch")
+        self.page_sizer = PageSizer(config.MAX_NUM, config.MIN_PAGE_SIZE, config.MAX_PAGE_SIZE, config.PAGE_TARGET_SECONDS)
+        self.risk_scheduler = RiskScheduler(json.loads(config.RISK_TIERS))
+        self.perpetual_states = PerpetualStates(self.web3, config.PERPETUAL_MAX_IDLE, config.MAX_LOG_BLOCK_RANGE)
+        self.scan_engine = ScanEngine(config.SCAN_CONCURRENCY, config.POOL_CONCURRENCY, config.PERPETUAL_TIMEOUT)
+
+        self.discovery = PerpetualDiscovery(self.web3, config.DISCOVERY_TTL, config.DISCOVERY_EVENT_INTERVAL)
+        self.snapshot = None
+        if config.SNAPSHOT_PATH:
+            from .snapshot import Snapshot
+            self.snapshot = Snapshot(config.SNAPSHOT_PATH)
+        self.shard = None
+        if config.SHARD_COORDINATOR:
+            from lib.coordinator import SqliteCoordinator
+            from .sharding import Shard
+            member_id = config.SHARD_ID or f"{socket.gethostname()}-{os.getpid()}"
+            self.shard = Shard(SqliteCoordinator(config.SHARD_COORDINATOR, member_id), config.SHARD_LEASE_TTL, config.LIQUIDATION_CLAIM_TTL)
 
         # watcher
-        self.watcher = Watcher(self.web3)
+        profiler = None
+        if config.PROFILE_PATH:
+            from lib.profiler import SamplingProfiler
+            profiler = SamplingProfiler(config.PROFILE_PATH, config.PROFILE_INTERVAL)
+        self.watcher = Watcher(self.web3, config.WATCH_MODE == 'block', config.BLOCK_POLL_INTERVAL, config.WATCH_INTERVAL, profiler)
 
     def _set_liquidity_pools(self):
         if config.IS_USE_WHITELIST:
@@ -44,32 +102,43 @@ class Keeper:
                 pool = LiquidityPool(web3=self.web3, address=Address(pool_addr))
                 self.perpetuals[perpetual] = pool
         else:
-            self._get_perpetuals()
+            if self.snapshot is not None:
+                self.discovery.restore(self.snapshot.perpetual_keys(), self.snapshot.block_number())
+            self.discovery.start()
+            self.perpetuals = self.discovery.snapshot()
+
+    def _restore_snapshot(self):
+        try:
+            for key in self.perpetuals:
+                index = AccountIndex(self.perpetuals[key], int(key.split("-")[1]), self.batch_caller, self.page_sizer, self.prefetcher)
+                if self.snapshot.load_account_index(key, index):
+                    self.account_indexes[key] = index
+            # wait for the receipts of liquidations sent before restart instead of sending them again
+            for key, tx_hash, trader, sent_at in self.snapshot.pending():
+                if key not in self.perpetuals:
+                    continue
+                liquidation = self._liquidation(key, trader)
+                liquidation.tx_hash = HexBytes(tx_hash)
+                liquidation.sent_at = sent_at
+                self.submitter.track(liquidation)
+            self.logger.info(f"snapshot restored. block:{self.snapshot.block_number()} account indexes:{len(self.account_indexes)}")
+        except Exception as e:
+            self.logger.warning(f"restore snapshot error:{e}")
 
-    def _get_perpetuals(self):
+    def _save_snapshot(self, block_number):
+        keys = dict(((pool.address.address, int(key.split("-")[1])), key) for key, pool in self.perpetuals.items())
+        pending = []
+        for liquidation in self.submitter.pending_liquidations():
+            key = keys.get((liquidation.pool.address.address, liquidation.perpetual_index))
+            if key is not None:
+                pending.append((key, liquidation))
+        # rows are written from another thread, off the sweep
         try:
-            query = '''
-            {
-                perpetuals(where: {openInterest_not: "0", state:2}) {
-                    id
-                }
-            }
-            '''
-            res = requests.post(config.GRAPH_URL, json={'query': query}, timeout=20)
-            if res.status_code == 200:
-                perpetuals = res.json()['data']['perpetuals']
-                self.perpetuals = {}
-                for perpetual in perpetuals:
-                    pool_addr = perpetual['id'].split("-")[0]
-                    if pool_addr in config.POOL_BLACK_LIST:
-                        self.logger.info(f"pool in black list: {pool_addr}")
-                        continue
-                    pool = LiquidityPool(web3=self.web3, address=Address(pool_addr))
-                    self.perpetuals[perpetual['id']] = pool
+            if not self.snapshot.save_in_background(block_number, self.perpetuals, self.account_indexes, pending):
+                self.logger.info(f"snapshot still saving, skip block:{block_number}")
         except Exception as e:
-            self.logger.warning(f"get all perpetuals from graph error: {e}")
+            self.logger.warning(f"save snapshot error:{e}")
 
- 
     def _check_keeper_account(self):
         with open(config.KEEPER_KEY) as f:
             read_key = f.read().replace("\n","")
@@ -79,82 +148,251 @@ class Keeper:
                 print(acct.address)
                 self.keeper_account = Address(acct.address)
                 self.web3.middleware_onion.add(construct_sign_and_send_raw_middleware(acct))
+                self.submitter = Submitter(self.web3, acct, self.gas_strategy, config.MAX_BATCH_SIZE,
+                                           config.GAS_REPLACE_INTERVAL, config.GAS_BUMP, config.MAX_REPLACEMENTS,
+                                           config.GAS_LIMIT_MARGIN)
             except Exception as e:
                 self.logger.warning(f"check private key error: {e}")
                 return False
             
         return True
 
-    def _check_all_perpetuals(self):
-        def thread_fun(perp_key):
-            self._check_perpetual_accounts(perp_key)
+    def _get_account_index(self, key) -> AccountIndex:
+        index = self.account_indexes.get(key)
+        if index is None:
+            index = AccountIndex(self.perpetuals[key], int(key.split("-")[1]), self.batch_caller, self.page_sizer, self.prefetcher)
+            self.account_indexes[key] = index
+        return index
 
-        # not use pool whitelist, get all pools onchain
+    def _check_all_perpetuals(self):
+        start = time.time()
+        # not use pool whitelist, take the perpetuals discovered in background
         if not config.IS_USE_WHITELIST:
-            self._get_perpetuals()
+            self.perpetuals = self.discovery.snapshot()
+            for key in list(self.account_indexes.keys()):
+                if key not in self.perpetuals:
+                    del self.account_indexes[key]
 
-        thread_list = []
-        for key in self.perpetuals.keys():
-            thread = threading.Thread(target=thread_fun, args=(key,))
-            thread_list.append(thread)
+        keys = list(self.perpetuals.keys())
+        if self.shard is not None:
+            keys = [key for key in keys if self.shard.owns(key)]
+            # perpetuals moved to other keepers start from scratch if they come back
+            for key in list(self.account_indexes.keys()):
+                if not self.shard.owns(key):
+                    del self.account_indexes[key]
+        try:
+            block_number = self.web3.eth.blockNumber
+            # perpetual info and active account count of all perpetuals in one bundle
+            calls = []
+            for key in keys:
+                pool = self.perpetuals[key]
+                perp_index = int(key.split("-")[1])
+                calls.append(pool.perpetual_info_call(perp_index))
+                calls.append(pool.accounts_count_call(perp_index))
+            results = self.batch_caller.try_call(calls)
+        except Exception as e:
+            self.logger.warning(f"get perpetuals state error:{e}")
+            return
 
-        for i in range(len(thread_list)):
-            thread_list[i].start()
+        # a perpetual whose state cannot be read is left out of this cycle only
+        states = {}
+        failed = []
+        for i, key in enumerate(keys):
+            info, count = results[2*i], results[2*i+1]
+            try:
+                if isinstance(info, Exception):
+                    raise info
+                if isinstance(count, Exception):
+                    raise count
+                states[key] = (LiquidityPool.parse_perpetual_info(info), count)
+            except Exception as e:
+                self.logger.warning(f"get perpetual {key} state error:{e}")
+                failed.append(key)
 
-        for i in range(len(thread_list)):
-            thread_list[i].join()
+        keys = self.perpetual_states.select(self.perpetuals, states, self.account_indexes, block_number, failed)
+        checked = set()
 
+        def check(key):
+            if self._check_perpetual(key, block_number, *states[key]):
+                checked.add(key)
+        self.scan_engine.run(keys, check)
+        CYCLE_SECONDS.observe(time.time() - start)
         self.logger.info(f"check all perpetuals end!")
 
+        # only a sweep that read every perpetual counts for readiness and health
+        unchecked = [key for key in keys if key not in checked]
+        if len(self.perpetuals) == 0 or len(failed) > 0 or len(unchecked) > 0:
+            self.logger.warning(f"sweep incomplete. perpetuals:{len(self.perpetuals)} failed:{len(failed)} unchecked:{len(unchecked)}")
+        else:
+            self._swept(block_number)
 
-    def _check_perpetual_accounts(self, key):
-        perp_index = int(key.split("-")[1])
-        pool = self.perpetuals[key]
-        is_continue = True
-        i = 0
-        while is_continue:
-            try:
-                accounts = self.reader.getAccountsInfo(pool.address.address, perp_index, i*config.MAX_NUM, (i+1)*config.MAX_NUM)
-                if len(accounts) < config.MAX_NUM :
-                    is_continue = False
-                i += 1
-            except Exception as e:
-                self.logger.warning(f"getAccountsInfo error:{e}")
-
-            for account in accounts:
-                self.logger.info(f"check_account pool_address:{pool.address} perp_index:{perp_index} address:{account.address} margin:{account.margin} position:{account.position}")
-                if not account.is_safe:
-                    self.logger.info(f"account unsafe:{account.address}")
-                    try:
-                        tx_hash = pool.liquidateByAMM(perp_index, account.address, self.keeper_account, self.gas_price)
-                        transaction_status = self._wait_transaction_receipt(tx_hash, 10)
-                        if transaction_status:
-                            self.logger.info(f"liquidate success. address:{account.address}")
-                        else:
-                            self.logger.info(f"liquidate fail. address:{account.address}")
-                    except Exception as e:
-                        self.logger.fatal(f"liquidate failed. address:{account.address} error:{e}")
-
-    def _wait_transaction_receipt(self, tx_hash, times):
-        self.logger.info(f"tx_hash:{self.web3.toHex(tx_hash)}")
-        for i in range(times):
-            try:
-                tx_receipt = self.web3.eth.waitForTransactionReceipt(tx_hash, config.TX_TIMEOUT)
-                self.logger.info(tx_receipt)
-                status = tx_receipt['status']
-
-                if status == 0:
-                    # transaction failed
-                    return False
-                elif status == 1:
-                    # transaction success
-                    return True
-            except:
+        if self.snapshot is not None:
+            if self.snapshot.saved_at is None or time.time() - self.snapshot.saved_at >= config.SNAPSHOT_INTERVAL:
+                self._save_snapshot(block_number)
+
+    def _swept(self, block_number):
+        self.last_sweep_at = time.time()
+        self.last_block_number = block_number
+        if self.first_sweep_at is None:
+            self.first_sweep_at = self.last_sweep_at
+            FIRST_SWEEP_SECONDS.set(self.first_sweep_at - self.started_at)
+            self.logger.info(f"first sweep done {self.first_sweep_at - self.started_at:.3f}s after start")
+
+    def _check_perpetual(self, key, block_number, info, count) -> bool:
+        """Returns True if all accounts of the perpetual could be read."""
+        start = time.time()
+        clean = False
+        read = False
+        try:
+            clean, read = self._check_perpetual_accounts(key, block_number, info, count)
+        finally:
+            if clean:
+                self.perpetual_states.mark_clean(key, info, count, block_number)
+            else:
+                self.perpetual_states.mark_dirty(key)
+            PERPETUAL_CHECK_SECONDS.labels(key).observe(time.time() - start)
+        return read
+
+    def _check_perpetual_accounts(self, key, block_number, info, count) -> tuple:
+        """Returns whether all accounts were read and none is unsafe, and whether all accounts were read."""
+        index = self._get_account_index(key)
+        # accounts are checked and unsafe ones handed to the submitter page by page while the next pages are fetched
+        fetched = set()
+        unsafe = []
+        at_risk = 0
+        try:
+            for accounts in index.sync(self.reader, block_number, info, count):
+                ACCOUNTS_SCANNED.labels(key).inc(len(accounts))
+                at_risk += self._log_accounts(key, info, accounts)
+                fetched.update(accounts.addresses)
+                for trader in accounts.unsafe_addresses():
+                    unsafe.append(trader)
+                    self._liquidate(key, trader, info)
+        except Exception as e:
+            self.logger.warning(f"sync accounts error:{e}")
+            UNSAFE_ACCOUNTS.labels(key).inc(len(unsafe))
+            return False, False
+        PAGE_SIZE.labels(key).set(self.page_sizer.size(index.page_key))
+
+        # accounts that crossed their liquidation price are liquidated without an onchain check
+        crossed = [trader for trader in index.crossed(info) if trader not in fetched]
+        for trader in crossed:
+            self._liquidate(key, trader, info)
+        unsafe += crossed
+        UNSAFE_ACCOUNTS.labels(key).inc(len(unsafe))
+
+        # re-check onchain the accounts due in their risk tier
+        checked = fetched | set(unsafe)
+        refreshed = AccountBatch()
+        refresh_error = False
+        try:
+            refreshed = index.refresh([trader for trader in self.risk_scheduler.due(index.engine, info) if trader not in checked], info)
+        except Exception as e:
+            self.logger.warning(f"refresh due accounts error:{e}")
+            refresh_error = True
+
+        ACCOUNTS_SCANNED.labels(key).inc(len(refreshed))
+        at_risk += self._log_accounts(key, info, refreshed)
+        unsafe_refreshed = refreshed.unsafe_addresses()
+        UNSAFE_ACCOUNTS.labels(key).inc(len(unsafe_refreshed))
+        for trader in unsafe_refreshed:
+            self._liquidate(key, trader, info)
+        self.logger.info(f"check perpetual {key} block:{block_number} accounts:{index.engine.size} fetched:{len(fetched)} "
+                         f"refreshed:{len(refreshed)} at risk:{at_risk} unsafe:{len(unsafe) + len(unsafe_refreshed)}")
+        return not refresh_error and len(unsafe) + len(unsafe_refreshed) == 0, not refresh_error
+
+    def _log_accounts(self, key, info, accounts) -> int:
+        """Logs the accounts within LOG_RISK_HEADROOM of their maintenance margin and a sample of the others.
+
+        Returns the number of accounts at risk.
+        """
+        mark_price = info.mark_price.value
+        maintenance_margin_rate = info.maintenance_margin_rate.value
+        keeper_gas_reward = info.keeper_gas_reward.value
+        at_risk = 0
+        for i, margin in enumerate(accounts.margins):
+            position = accounts.positions[i]
+            threshold = max(abs(position) * mark_price // 10**18 * maintenance_margin_rate // 10**18, keeper_gas_reward)
+            if not accounts.is_safe[i] or margin < threshold * (1 + config.LOG_RISK_HEADROOM):
+                at_risk += 1
+            elif config.LOG_SAMPLE_RATE <= 0 or random.random() >= config.LOG_SAMPLE_RATE:
                 continue
+            self.logger.info(f"check_account perpetual:{key} address:{Address(accounts.addresses[i])} margin:{Wad(margin)} "
+                             f"position:{Wad(position)} safe:{accounts.is_safe[i]}")
+        return at_risk
+
+    @staticmethod
+    def _claim_key(key, trader) -> str:
+        return f"{key.lower()}-{trader.hex()}"
+
+    def _liquidation(self, key, trader, info=None) -> Liquidation:
+        index = self._get_account_index(key)
+
+        def on_done(status):
+            # re-fetch the account whatever the result
+            index.mark_dirty(trader)
+            if status is None and self.shard is not None:
+                # never confirmed, let any keeper try again
+                self.shard.release(self._claim_key(key, trader))
+        liquidation = Liquidation(self.perpetuals[key], int(key.split("-")[1]), trader, on_done)
+        if info is not None and config.GAS_REWARD_RATE > 0:
+            # never pay more gas than the reward for liquidating
+            liquidation.max_gas_cost = int(float(info.keeper_gas_reward) * config.GAS_REWARD_RATE * 1e18)
+        return liquidation
+
+    def _liquidate(self, key, trader, info=None):
+        self.logger.info(f"account unsafe:{Address(trader)}")
+        if self.shard is not None and not self.shard.claim(self._claim_key(key, trader)):
+            self.logger.info(f"liquidation claimed by another keeper. address:{Address(trader)}")
+            return
+        liquidation = self._liquidation(key, trader, info)
+        if not self.submitter.submit(liquidation):
+            self.logger.info(f"liquidation already in flight. address:{Address(trader)}")
 
 
+    def status(self) -> dict:
+        """Readiness and health for the metrics server, ready after the first sweep."""
+        now = time.time()
+        status = {
+            'ready': self.first_sweep_at is not None,
+            'healthy': self.last_sweep_at is not None and now - self.last_sweep_at < config.HEALTH_MAX_SWEEP_AGE,
+            'uptime': now - self.started_at,
+            'time_to_first_sweep': None if self.first_sweep_at is None else self.first_sweep_at - self.started_at,
+            'last_sweep_age': None if self.last_sweep_at is None else now - self.last_sweep_at,
+            'block_number': self.last_block_number,
+            'perpetuals': len(self.perpetuals),
+        }
+        if self.first_sweep_at is None:
+            # still starting up, not stale yet
+            status['healthy'] = now - self.started_at < config.HEALTH_MAX_SWEEP_AGE
+        return status
+
+    def _warm_up(self):
+        """Opens node connections and reads the chain id and gas price while the keeper starts."""
+        try:
+            self.web3.eth.blockNumber
+            self.gas_strategy.price()
+            return self.web3.eth.chainId
+        except Exception as e:
+            self.logger.warning(f"warm up error:{e}")
+            return None
+
     def main(self):
-        if self._check_keeper_account():
-            self._set_liquidity_pools()
-            self.watcher.add_block_syncer(self._check_all_perpetuals)
-            self.watcher.run()
+        if config.METRICS_PORT:
+            start_http_server(config.METRICS_PORT, config.METRICS_ADDR, status=self.status)
+        # the account, the perpetuals and the node connections do not depend on each other
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix="init") as executor:
+            account = executor.submit(self._check_keeper_account)
+            pools = executor.submit(self._set_liquidity_pools)
+            warm_up = executor.submit(self._warm_up)
+            if not account.result():
+                return
+            pools.result()
+            self.submitter.chain_id = warm_up.result()
+        if self.snapshot is not None:
+            self._restore_snapshot()
+        self.submitter.start()
+        if self.shard is not None:
+            self.shard.start()
+        self.watcher.add_block_syncer(self._check_all_perpetuals)
+        self.watcher.run()
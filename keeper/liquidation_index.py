@@ -0,0 +1,66 @@
+import numpy as np
+
+from contract.liquidity_pool import PerpetualInfo
+from .margin_engine import MarginEngine
+
+
+class LiquidationPriceIndex:
+    """Accounts of one perpetual sorted by liquidation price, longs and shorts apart.
+
+    With k = -cash / position the liquidation price is (uaf + k) / (1 - mmr) for
+    a long and (uaf + k) / (1 + mmr) for a short. The order of k does not depend
+    on price, funding or margin rate, so the accounts unsafe at a mark price are
+    found by bisect. The keeper gas reward floor is left to the margin engine.
+    """
+    def __init__(self):
+        self.version = None
+        self.long_keys = np.zeros(0)
+        self.long_traders = np.zeros(0, dtype=object)
+        self.short_keys = np.zeros(0)
+        self.short_traders = np.zeros(0, dtype=object)
+
+    def build(self, engine: MarginEngine):
+        if self.version == engine.version:
+            return
+        position = engine.position[:engine.size]
+        cash = engine.cash[:engine.size]
+        traders = np.array(engine.traders, dtype=object)
+
+        longs = position > 0
+        keys = -cash[longs] / position[longs]
+        order = np.argsort(keys, kind='stable')
+        self.long_keys = keys[order]
+        self.long_traders = traders[longs][order]
+
+        shorts = position < 0
+        keys = -cash[shorts] / position[shorts]
+        order = np.argsort(keys, kind='stable')
+        self.short_keys = keys[order]
+        self.short_traders = traders[shorts][order]
+        self.version = engine.version
+
+    @staticmethod
+    def _thresholds(info: PerpetualInfo):
+        # a long is unsafe when k > long threshold, a short when k < short threshold
+        mark_price = float(info.mark_price)
+        rate = float(info.maintenance_margin_rate)
+        funding = float(info.unit_accumulative_funding)
+        return mark_price * (1 - rate) - funding, mark_price * (1 + rate) - funding
+
+    def unsafe(self, info: PerpetualInfo) -> list:
+        long_threshold, short_threshold = self._thresholds(info)
+        longs = self.long_traders[np.searchsorted(self.long_keys, long_threshold, side='right'):]
+        shorts = self.short_traders[:np.searchsorted(self.short_keys, short_threshold, side='left')]
+        return longs.tolist() + shorts.tolist()
+
+    def crossed(self, last_info: PerpetualInfo, info: PerpetualInfo) -> list:
+        """Returns traders unsafe under info that were safe under last_info."""
+        if last_info is None:
+            return self.unsafe(info)
+        long_threshold, short_threshold = self._thresholds(info)
+        last_long_threshold, last_short_threshold = self._thresholds(last_info)
+        longs = self.long_traders[np.searchsorted(self.long_keys, long_threshold, side='right'):
+                                  np.searchsorted(self.long_keys, last_long_threshold, side='right')]
+        shorts = self.short_traders[np.searchsorted(self.short_keys, last_short_threshold, side='left'):
+                                    np.searchsorted(self.short_keys, short_threshold, side='left')]
+        return longs.tolist() + shorts.tolist()
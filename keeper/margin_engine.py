@@ -0,0 +1,107 @@
+import time
+
+import numpy as np
+
+from contract.liquidity_pool import PerpetualInfo
+from contract.reader import AccountBatch
+
+
+class MarginEngine:
+    """Cash and position of all accounts of one perpetual in NumPy columns.
+
+    Margin and maintenance margin of every account are evaluated in one
+    vectorized pass, so only the accounts close to the maintenance threshold
+    need to be confirmed onchain. Values are float approximations of the
+    onchain wad math, which is why accounts are re-checked with some headroom.
+    """
+    def __init__(self):
+        self.traders = []
+        # trader address -> row
+        self.rows = {}
+        self.size = 0
+        # bumped on every change, so derived indexes know when to rebuild
+        self.version = 0
+        self.cash = np.zeros(0)
+        self.position = np.zeros(0)
+        # when each account was last read from chain
+        self.checked_at = np.zeros(0)
+
+    @staticmethod
+    def _cash(account, info: PerpetualInfo) -> float:
+        # margin = cash + position * (markPrice - unitAccumulativeFunding)
+        return float(account.margin) - float(account.position) * (float(info.mark_price) - float(info.unit_accumulative_funding))
+
+    def load(self, batch: AccountBatch, info: PerpetualInfo):
+        self.load_columns(batch.addresses, np.array(batch.positions, dtype=np.float64) / 1e18,
+                          np.array(batch.margins, dtype=np.float64) / 1e18, info)
+
+    def load_columns(self, traders: list, position, margin, info: PerpetualInfo):
+        """Load accounts from position and margin arrays, already divided by 1e18."""
+        self.traders = list(traders)
+        self.rows = dict((trader, row) for row, trader in enumerate(self.traders))
+        if len(self.rows) < len(self.traders):
+            # an account listed twice as pages shifted, keep its last row
+            keep = sorted(self.rows.values())
+            self.traders = [self.traders[row] for row in keep]
+            self.rows = dict((trader, row) for row, trader in enumerate(self.traders))
+            position = position[keep]
+            margin = margin[keep]
+        self.size = len(self.traders)
+        self.cash = margin - position * (float(info.mark_price) - float(info.unit_accumulative_funding))
+        self.position = position
+        self.checked_at = np.full(self.size, time.time())
+        self.version += 1
+
+    def restore(self, traders: list, cash: list, position: list, checked_at: list):
+        """Load rows saved from another engine, values are already in engine units."""
+        self.traders = list(traders)
+        self.rows = dict((trader, row) for row, trader in enumerate(self.traders))
+        self.size = len(self.traders)
+        self.cash = np.array(cash, dtype=np.float64)
+        self.position = np.array(position, dtype=np.float64)
+        self.checked_at = np.array(checked_at, dtype=np.float64)
+        self.version += 1
+
+    def set(self, account, info: PerpetualInfo):
+        row = self.rows.get(account.address)
+        if row is None:
+            if self.size == len(self.cash):
+                capacity = max(16, self.size * 2)
+                self.cash = np.resize(self.cash, capacity)
+                self.position = np.resize(self.position, capacity)
+                self.checked_at = np.resize(self.checked_at, capacity)
+            row = self.size
+            self.size += 1
+            self.traders.append(account.address)
+            self.rows[account.address] = row
+        self.cash[row] = self._cash(account, info)
+        self.position[row] = float(account.position)
+        self.checked_at[row] = time.time()
+        self.version += 1
+
+    def remove(self, trader):
+        row = self.rows.pop(trader, None)
+        if row is None:
+            return
+        # move the last row into the hole
+        last = self.size - 1
+        if row != last:
+            moved = self.traders[last]
+            self.traders[row] = moved
+            self.rows[moved] = row
+            self.cash[row] = self.cash[last]
+            self.position[row] = self.position[last]
+            self.checked_at[row] = self.checked_at[last]
+        self.traders.pop()
+        self.size = last
+        self.version += 1
+
+    def headroom(self, info: PerpetualInfo):
+        """Returns margin / max(maintenance margin, keeper gas reward) - 1 of every row."""
+        position = self.position[:self.size]
+        mark_price = float(info.mark_price)
+        margin = self.cash[:self.size] + position * (mark_price - float(info.unit_accumulative_funding))
+        threshold = np.maximum(np.abs(position) * mark_price * float(info.maintenance_margin_rate), float(info.keeper_gas_reward))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            headroom = np.where(threshold > 0, margin / threshold - 1, np.where(margin < 0, -np.inf, np.inf))
+        return headroom
@@ -0,0 +1,14 @@
+from lib.metrics import Counter, Gauge, Histogram
+
+FIRST_SWEEP_SECONDS = Gauge('keeper_first_sweep_seconds', "Time from start to the end of the first check of all perpetuals")
+CYCLE_SECONDS = Histogram('keeper_cycle_seconds', "Duration of a check of all perpetuals")
+SKIPPED_PERPETUALS = Counter('keeper_skipped_perpetuals_total', "Perpetual sweeps skipped, by reason", ['reason'])
+PERPETUAL_CHECK_SECONDS = Histogram('keeper_perpetual_check_seconds', "Duration of the check of one perpetual", ['perpetual'])
+ACCOUNTS_SCANNED = Counter('keeper_accounts_scanned_total', "Margin accounts read from chain", ['perpetual'])
+UNSAFE_ACCOUNTS = Counter('keeper_unsafe_accounts_total', "Unsafe margin accounts found", ['perpetual'])
+LIQUIDATION_SEND_SECONDS = Histogram('keeper_liquidation_send_seconds', "Time from detection to liquidation transaction sent")
+LIQUIDATION_RECEIPT_SECONDS = Histogram('keeper_liquidation_receipt_seconds', "Time from detection to liquidation transaction receipt")
+LIQUIDATIONS = Counter('keeper_liquidations_total', "Liquidations by result", ['result'])
+PAGE_SIZE = Gauge('keeper_page_size', "Learned getAccountsInfo page size", ['perpetual'])
+GAS_PRICE = Gauge('keeper_gas_price_gwei', "Gas price of the last liquidation sent or replaced")
+REPLACEMENTS = Counter('keeper_tx_replacements_total', "Liquidation transactions replaced at a higher gas price")
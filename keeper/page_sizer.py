@@ -0,0 +1,63 @@
+import threading
+import time
+
+
+class PageSizer:
+    """Learns the getAccountsInfo page size per endpoint and perpetual.
+
+    The size doubles while full pages return within half of target seconds,
+    shrinks when a page is slower than target and halves when a call fails,
+    e.g. on timeout or out of gas. A failed size is not tried again until
+    ceiling_ttl seconds have passed, sizes in between are approached by halving
+    the gap.
+    """
+    def __init__(self, initial: int, min_size: int, max_size: int, target: float, ceiling_ttl: float = 3600):
+        assert(0 < min_size <= initial <= max_size)
+
+        self.initial = initial
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target = target
+        self.ceiling_ttl = ceiling_ttl
+        self.lock = threading.Lock()
+        # key -> page size
+        self.sizes = {}
+        # key -> (smallest failed size, when it failed)
+        self.ceilings = {}
+
+    def size(self, key) -> int:
+        return self.sizes.get(key, self.initial)
+
+    def _ceiling(self, key):
+        ceiling = self.ceilings.get(key)
+        if ceiling is None:
+            return None
+        if time.time() - ceiling[1] >= self.ceiling_ttl:
+            del self.ceilings[key]
+            return None
+        return ceiling[0]
+
+    def success(self, key, size: int, seconds: float, full: bool):
+        """Record pages of size that took seconds each, full is False if all accounts fit in one page."""
+        with self.lock:
+            if seconds > self.target:
+                self.sizes[key] = max(self.min_size, int(size * self.target / seconds))
+                return
+            if not full or seconds > self.target / 2:
+                return
+            grown = min(self.max_size, size * 2)
+            ceiling = self._ceiling(key)
+            if ceiling is not None and grown >= ceiling:
+                grown = size + (ceiling - size) // 2
+            self.sizes[key] = max(size, grown)
+
+    def failure(self, key, size: int) -> bool:
+        """Record a failed call with size, returns False if there is no smaller size to retry with."""
+        with self.lock:
+            if size <= self.min_size:
+                return False
+            ceiling = self._ceiling(key)
+            if ceiling is None or size < ceiling:
+                self.ceilings[key] = (size, time.time())
+            self.sizes[key] = max(self.min_size, size // 2)
+            return True
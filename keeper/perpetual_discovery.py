@@ -0,0 +1,161 @@
+import logging
+import threading
+import time
+
+import requests
+from web3 import Web3
+
+import config
+from lib.address import Address
+from contract.liquidity_pool import LiquidityPool
+
+
+class PerpetualDiscovery:
+    """Cached perpetual list of all pools, refreshed off the scan path.
+
+    The graph is queried every DISCOVERY_TTL seconds and the list is diffed, so
+    pool objects of known perpetuals are kept. In between, perpetual create and
+    state events of known pools are applied, which keeps discovery going while
+    the graph is slow or down. Perpetuals found by events stay until the graph
+    lists them or they are closed. Perpetual keys are "<pool lowercase>-<index>" as
+    returned by the graph.
+    """
+    logger = logging.getLogger()
+
+    def __init__(self, web3: Web3, ttl: int, event_interval: int):
+        assert(isinstance(web3, Web3))
+
+        self.web3 = web3
+        self.ttl = ttl
+        self.event_interval = event_interval
+        self.lock = threading.Lock()
+        # perpetual key -> LiquidityPool, pools are shared by their perpetuals
+        self.perpetuals = {}
+        self.pools = {}
+        # perpetuals seen going to emergency or cleared, ignored if the graph lags behind
+        self.closed = set()
+        # perpetual key -> block of the event it was found by, kept until the graph lists it
+        self.found = {}
+        self.graph_at = None
+        # last block whose events have been applied
+        self.block_number = None
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return dict(self.perpetuals)
+
+    def restore(self, keys: list, block_number: int):
+        """Seed the cache with perpetuals saved by a previous run, events are caught up from block_number."""
+        with self.lock:
+            for key in keys:
+                self.perpetuals[key] = self._pool(key.split("-")[0])
+        self.block_number = block_number
+
+    def _pool(self, pool_addr: str) -> LiquidityPool:
+        pool = self.pools.get(pool_addr)
+        if pool is None:
+            pool = LiquidityPool(web3=self.web3, address=Address(pool_addr))
+            self.pools[pool_addr] = pool
+        return pool
+
+    def _get_graph_perpetuals(self) -> list:
+        query = '''
+        {
+            perpetuals(where: {openInterest_not: "0", state:2}) {
+                id
+            }
+        }
+        '''
+        res = requests.post(config.GRAPH_URL, json={'query': query}, timeout=20)
+        if res.status_code != 200:
+            raise Exception(f"graph status code {res.status_code}")
+        return [perpetual['id'] for perpetual in res.json()['data']['perpetuals']]
+
+    def refresh_graph(self) -> bool:
+        try:
+            keys = self._get_graph_perpetuals()
+        except Exception as e:
+            self.logger.warning(f"get all perpetuals from graph error: {e}")
+            return False
+
+        with self.lock:
+            perpetuals = {}
+            for key in keys:
+                pool_addr = key.split("-")[0]
+                if pool_addr in config.POOL_BLACK_LIST:
+                    self.logger.info(f"pool in black list: {pool_addr}")
+                    continue
+                if key in self.closed:
+                    continue
+                perpetuals[key] = self._pool(pool_addr)
+            for key in self.found.keys() & perpetuals.keys():
+                del self.found[key]
+            for key, block_number in self.found.items():
+                # the graph may not have indexed the event yet
+                if key not in perpetuals and key not in self.closed:
+                    self.logger.debug(f"perpetual {key} found at block {block_number} not in graph yet")
+                    perpetuals[key] = self._pool(key.split("-")[0])
+            added = perpetuals.keys() - self.perpetuals.keys()
+            removed = self.perpetuals.keys() - perpetuals.keys()
+            self.perpetuals = perpetuals
+            self.pools = dict((key.split("-")[0], pool) for key, pool in perpetuals.items())
+        self.graph_at = time.time()
+        if len(added) > 0 or len(removed) > 0:
+            self.logger.info(f"perpetuals from graph added:{sorted(added)} removed:{sorted(removed)}")
+        return True
+
+    def refresh_events(self):
+        try:
+            block_number = self.web3.eth.blockNumber
+            if self.block_number is None or block_number - self.block_number > config.MAX_LOG_BLOCK_RANGE:
+                # too far behind to catch up, the graph covers the gap
+                self.block_number = block_number
+                return
+            if block_number <= self.block_number:
+                return
+            with self.lock:
+                addresses = [pool.address.address for pool in self.pools.values()]
+            if len(addresses) == 0:
+                self.block_number = block_number
+                return
+            logs = self.web3.eth.getLogs({
+                'address': addresses,
+                'fromBlock': self.block_number + 1,
+                'toBlock': block_number,
+                'topics': [list(LiquidityPool.perpetual_event_topics.keys())],
+            })
+        except Exception as e:
+            self.logger.warning(f"get perpetual events error: {e}")
+            return
+
+        with self.lock:
+            perpetuals = dict(self.perpetuals)
+            for log in logs:
+                name = LiquidityPool.perpetual_event_topics[log['topics'][0].hex()]
+                # perpetualIndex is the first non-indexed argument of all perpetual events
+                key = f"{log['address'].lower()}-{int(log['data'][2:66], 16)}"
+                if name in ('CreatePerpetual', 'SetNormalState'):
+                    if key not in perpetuals and key not in self.closed:
+                        self.logger.info(f"perpetual {key} found by {name} event")
+                        perpetuals[key] = self._pool(key.split("-")[0])
+                        self.found[key] = log['blockNumber']
+                else:
+                    self.closed.add(key)
+                    self.found.pop(key, None)
+                    if perpetuals.pop(key, None) is not None:
+                        self.logger.info(f"perpetual {key} removed by {name} event")
+            self.perpetuals = perpetuals
+        self.block_number = block_number
+
+    def _run(self):
+        while True:
+            time.sleep(self.event_interval)
+            if self.graph_at is None or time.time() - self.graph_at >= self.ttl:
+                self.refresh_graph()
+            self.refresh_events()
+
+    def start(self):
+        """Fill the cache once, then keep it fresh in a daemon thread."""
+        self.refresh_graph()
+        self.refresh_events()
+        threading.Thread(target=self._run, daemon=True, name="discovery").start()
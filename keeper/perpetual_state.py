@@ -0,0 +1,113 @@
+import logging
+import time
+
+from web3 import Web3
+
+from contract.liquidity_pool import LiquidityPool, PerpetualInfo, Status
+from .metrics import SKIPPED_PERPETUALS
+
+
+class PerpetualStates:
+    """Picks the perpetuals worth sweeping in a cycle.
+
+    Perpetuals not in NORMAL state cannot be liquidated and are not swept.
+    A perpetual is quiet when its last sweep found no unsafe account and
+    since then its mark price, funding index, margin parameters and active
+    account count are unchanged and none of its accounts emitted an event, as
+    found by one getLogs over all quiet pools. Margins only move with those
+    inputs, so quiet perpetuals are skipped, but still swept every max_idle
+    seconds.
+    """
+    logger = logging.getLogger()
+
+    def __init__(self, web3: Web3, max_idle: float, max_block_range: int):
+        assert(isinstance(web3, Web3))
+
+        self.web3 = web3
+        self.max_idle = max_idle
+        self.max_block_range = max_block_range
+        # key -> (inputs, block number, swept at) of the last clean sweep
+        self.clean = {}
+        # key -> last status seen
+        self.statuses = {}
+
+    @staticmethod
+    def _inputs(info: PerpetualInfo, count: int) -> tuple:
+        return (info.mark_price.value, info.unit_accumulative_funding.value, info.maintenance_margin_rate.value,
+                info.keeper_gas_reward.value, count)
+
+    def mark_clean(self, key: str, info: PerpetualInfo, count: int, block_number: int):
+        self.clean[key] = (self._inputs(info, count), block_number, time.time())
+
+    def mark_dirty(self, key: str):
+        self.clean.pop(key, None)
+
+    def select(self, perpetuals: dict, states: dict, account_indexes: dict, block_number: int, failed: list = ()) -> list:
+        """Returns the keys of states to sweep, in order.
+
+        failed are the perpetuals whose state could not be read, they are
+        swept in full once it can be read again.
+        """
+        for key in failed:
+            SKIPPED_PERPETUALS.labels('error').inc()
+            self.clean.pop(key, None)
+        sweep = set()
+        quiet = {}
+        now = time.time()
+        for key, (info, count) in states.items():
+            if self.statuses.get(key) != info.status:
+                if info.status != Status.NORMAL:
+                    self.logger.info(f"perpetual {key} is {info.status.name}, not swept")
+                self.statuses[key] = info.status
+            if info.status != Status.NORMAL:
+                SKIPPED_PERPETUALS.labels('status').inc()
+                self.clean.pop(key, None)
+                account_indexes.pop(key, None)
+                continue
+            clean = self.clean.get(key)
+            index = account_indexes.get(key)
+            if self.max_idle <= 0 or clean is None or index is None or len(index.dirty) > 0 or index.is_stale(block_number) \
+                    or clean[0] != self._inputs(info, count) or now - clean[2] >= self.max_idle:
+                sweep.add(key)
+                continue
+            quiet[key] = clean[1]
+
+        if len(quiet) > 0:
+            touched = self._touched(perpetuals, quiet, block_number)
+            for key in quiet:
+                if touched is None or key in touched:
+                    sweep.add(key)
+                    continue
+                SKIPPED_PERPETUALS.labels('quiet').inc()
+                # no account events up to this block
+                index = account_indexes[key]
+                index.block_number = max(index.block_number, block_number)
+                clean = self.clean[key]
+                self.clean[key] = (clean[0], block_number, clean[2])
+        return [key for key in states if key in sweep]
+
+    def _touched(self, perpetuals: dict, quiet: dict, block_number: int):
+        """Keys of quiet perpetuals with account events since their clean sweep, None if unknown."""
+        from_block = min(quiet.values()) + 1
+        if from_block > block_number:
+            return set()
+        if block_number - from_block >= self.max_block_range:
+            return None
+        keys = dict(((perpetuals[key].address.address.lower(), int(key.split("-")[1])), key) for key in quiet)
+        try:
+            logs = self.web3.eth.getLogs({
+                'address': sorted(set(perpetuals[key].address.address for key in quiet)),
+                'fromBlock': from_block,
+                'toBlock': block_number,
+                'topics': [list(LiquidityPool.account_event_topics.keys())],
+            })
+        except Exception as e:
+            self.logger.warning(f"get account events of quiet perpetuals error:{e}")
+            return None
+        touched = set()
+        for log in logs:
+            # perpetualIndex is the first non-indexed argument of all account events
+            key = keys.get((log['address'].lower(), int(log['data'][2:66], 16)))
+            if key is not None and log['blockNumber'] > quiet[key]:
+                touched.add(key)
+        return touched
@@ -0,0 +1,27 @@
+import time
+
+import numpy as np
+
+from contract.liquidity_pool import PerpetualInfo
+from .margin_engine import MarginEngine
+
+
+class RiskScheduler:
+    """Picks the accounts due for an onchain re-check by margin headroom.
+
+    tiers is a list of [max headroom, re-check interval in seconds] sorted by
+    headroom. Accounts with an interval of 0 are re-checked on every block,
+    accounts above the last tier are left to the full resync.
+    """
+    def __init__(self, tiers: list):
+        assert(len(tiers) > 0)
+
+        self.bounds = np.array([tier[0] for tier in tiers], dtype=np.float64)
+        assert(np.all(np.diff(self.bounds) > 0))
+        self.intervals = np.array([tier[1] for tier in tiers] + [np.inf], dtype=np.float64)
+
+    def due(self, engine: MarginEngine, info: PerpetualInfo) -> list:
+        tier = np.searchsorted(self.bounds, engine.headroom(info), side='right')
+        elapsed = time.time() - engine.checked_at[:engine.size]
+        mask = (engine.position[:engine.size] != 0) & (elapsed >= self.intervals[tier])
+        return [engine.traders[row] for row in np.flatnonzero(mask)]
@@ -0,0 +1,55 @@
+import asyncio
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ScanEngine:
+    """Checks perpetuals on an asyncio loop with bounded concurrency.
+
+    Contract calls are synchronous web3 calls, so each check runs on a fixed
+    worker pool instead of a new thread per perpetual. A check that exceeds
+    the timeout no longer holds the cycle open; it keeps its worker until it
+    returns and the perpetual is skipped in the meantime.
+    """
+    logger = logging.getLogger()
+
+    def __init__(self, max_workers: int, pool_concurrency: int, timeout: float):
+        self.max_workers = max_workers
+        self.pool_concurrency = pool_concurrency
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scan")
+        self.loop = asyncio.new_event_loop()
+        # perpetual keys whose check is still running on a worker
+        self.running = set()
+
+    def run(self, keys: list, check):
+        """Run check(key) for every perpetual key, returns when all finished or timed out."""
+        self.loop.run_until_complete(self._run(keys, check))
+
+    async def _run(self, keys, check):
+        # semaphores must be created on the running loop
+        workers = asyncio.Semaphore(self.max_workers)
+        pools = defaultdict(lambda: asyncio.Semaphore(self.pool_concurrency))
+        await asyncio.gather(*[self._check(key, check, workers, pools[key.split("-")[0]]) for key in keys])
+
+    async def _check(self, key, check, workers, pool):
+        if key in self.running:
+            self.logger.warning(f"skip perpetual:{key} as previous check is still running")
+            return
+
+        def target():
+            try:
+                check(key)
+            finally:
+                self.running.discard(key)
+
+        async with pool, workers:
+            self.running.add(key)
+            future = self.loop.run_in_executor(self.executor, target)
+            try:
+                await asyncio.wait_for(asyncio.shield(future), self.timeout)
+            except asyncio.TimeoutError:
+                self.logger.warning(f"check perpetual:{key} timeout after {self.timeout}s")
+            except Exception as e:
+                self.logger.warning(f"check perpetual:{key} error:{e}")
@@ -0,0 +1,86 @@
+import bisect
+import hashlib
+import logging
+import threading
+import time
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hashing of perpetual keys onto members, replicas points per member.
+
+    When a member joins or leaves only the keys next to its points move.
+    """
+    def __init__(self, members: list, replicas: int = 64):
+        points = sorted((_hash(f"{member}#{i}"), member) for member in members for i in range(replicas))
+        self.hashes = [point[0] for point in points]
+        self.members = [point[1] for point in points]
+
+    def owner(self, key: str):
+        if len(self.hashes) == 0:
+            return None
+        i = bisect.bisect(self.hashes, _hash(key)) % len(self.hashes)
+        return self.members[i]
+
+
+class Shard:
+    """The perpetuals this keeper checks when several keepers share a coordinator.
+
+    The member lease is renewed every lease_ttl / 3 seconds. A keeper that
+    stops renewing drops out of the ring once its lease expires and its
+    perpetuals move to the others. Liquidations are claimed on the coordinator
+    before sending, so two keepers that both own a perpetual during a
+    rebalance do not send the same one.
+    """
+    logger = logging.getLogger()
+
+    def __init__(self, coordinator, lease_ttl: float, claim_ttl: float):
+        self.coordinator = coordinator
+        self.lease_ttl = lease_ttl
+        self.claim_ttl = claim_ttl
+        self.members = [coordinator.member_id]
+        self.ring = HashRing(self.members)
+
+    def owns(self, key: str) -> bool:
+        # keys may come lowercase from the graph or checksummed from the whitelist
+        return self.ring.owner(key.lower()) == self.coordinator.member_id
+
+    def claim(self, key: str) -> bool:
+        try:
+            return self.coordinator.claim(key, self.claim_ttl)
+        except Exception as e:
+            # without the coordinator, sending twice is better than not at all
+            self.logger.warning(f"claim {key} error:{e}")
+            return True
+
+    def release(self, key: str):
+        try:
+            self.coordinator.release(key)
+        except Exception as e:
+            self.logger.warning(f"release {key} error:{e}")
+
+    def refresh(self):
+        try:
+            self.coordinator.heartbeat(self.lease_ttl)
+            members = self.coordinator.members()
+        except Exception as e:
+            self.logger.warning(f"shard heartbeat error:{e}")
+            return
+        if self.coordinator.member_id not in members:
+            members = sorted(members + [self.coordinator.member_id])
+        if members != self.members:
+            self.logger.info(f"shard members changed. self:{self.coordinator.member_id} members:{members}")
+            self.members = members
+            self.ring = HashRing(members)
+
+    def _run(self):
+        while True:
+            time.sleep(self.lease_ttl / 3)
+            self.refresh()
+
+    def start(self):
+        self.refresh()
+        threading.Thread(target=self._run, daemon=True, name="shard").start()
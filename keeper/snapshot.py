@@ -0,0 +1,108 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .account_index import AccountIndex
+
+
+class Snapshot:
+    """Warm-start state of the keeper in a SQLite file.
+
+    Holds the perpetual set, the account index of every perpetual, the last
+    checked block and the liquidation transactions still waiting for receipt.
+    Each save replaces the whole content in one transaction, so a crash while
+    saving leaves the previous snapshot intact.
+    """
+    logger = logging.getLogger()
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory != '':
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS perpetuals (key TEXT PRIMARY KEY, block_number INTEGER, synced_at REAL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS accounts (perpetual TEXT, trader BLOB, cash REAL, position REAL, checked_at REAL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS accounts_perpetual ON accounts (perpetual)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS pending (tx_hash BLOB PRIMARY KEY, perpetual TEXT, trader BLOB, sent_at REAL)")
+        self.saved_at = None
+        self.saving = None
+
+    def save(self, block_number: int, perpetuals: dict, account_indexes: dict, pending: list):
+        """pending is a list of (perpetual key, Liquidation) sent and waiting for receipt."""
+        self._write(*self._capture(block_number, perpetuals, account_indexes, pending))
+
+    def save_in_background(self, block_number: int, perpetuals: dict, account_indexes: dict, pending: list) -> bool:
+        """Copies the state and writes it from another thread, returns False if a save is still running."""
+        if self.saving is not None and self.saving.is_alive():
+            return False
+        state = self._capture(block_number, perpetuals, account_indexes, pending)
+        self.saved_at = time.time()
+
+        def write():
+            try:
+                self._write(*state)
+            except Exception as e:
+                self.logger.warning(f"save snapshot error:{e}")
+        self.saving = threading.Thread(target=write, name="snapshot", daemon=True)
+        self.saving.start()
+        return True
+
+    def _capture(self, block_number: int, perpetuals: dict, account_indexes: dict, pending: list) -> tuple:
+        """Copies of the columns to save, the account indexes keep changing while they are written."""
+        perpetual_rows = []
+        accounts = []
+        for key in perpetuals:
+            index = account_indexes.get(key)
+            if index is None or index.block_number is None:
+                perpetual_rows.append((key, None, None))
+                continue
+            perpetual_rows.append((key, index.block_number, index.synced_at))
+            engine = index.engine
+            size = engine.size
+            accounts.append((key, engine.traders[:size], engine.cash[:size].copy(), engine.position[:size].copy(),
+                             engine.checked_at[:size].copy()))
+        pending_rows = [(bytes(liquidation.tx_hash), key, liquidation.trader, liquidation.sent_at) for key, liquidation in pending]
+        return block_number, perpetual_rows, accounts, pending_rows
+
+    def _write(self, block_number: int, perpetual_rows: list, accounts: list, pending_rows: list):
+        account_rows = []
+        for key, traders, cash, position, checked_at in accounts:
+            account_rows += zip([key] * len(traders), traders, cash.tolist(), position.tolist(), checked_at.tolist())
+        with self.conn:
+            self.conn.execute("DELETE FROM meta")
+            self.conn.execute("DELETE FROM perpetuals")
+            self.conn.execute("DELETE FROM accounts")
+            self.conn.execute("DELETE FROM pending")
+            self.conn.execute("INSERT INTO meta VALUES ('block_number', ?)", (block_number,))
+            self.conn.executemany("INSERT INTO perpetuals VALUES (?, ?, ?)", perpetual_rows)
+            self.conn.executemany("INSERT INTO accounts VALUES (?, ?, ?, ?, ?)", account_rows)
+            self.conn.executemany("INSERT INTO pending VALUES (?, ?, ?, ?)", pending_rows)
+        self.saved_at = time.time()
+        self.logger.info(f"snapshot saved. block:{block_number} perpetuals:{len(perpetual_rows)} accounts:{len(account_rows)} pending:{len(pending_rows)}")
+
+    def block_number(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'block_number'").fetchone()
+        return None if row is None else row[0]
+
+    def perpetual_keys(self) -> list:
+        return [row[0] for row in self.conn.execute("SELECT key FROM perpetuals")]
+
+    def load_account_index(self, key: str, index: AccountIndex) -> bool:
+        """Restore the saved accounts of perpetual key into index, returns False if there are none."""
+        row = self.conn.execute("SELECT block_number, synced_at FROM perpetuals WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] is None:
+            return False
+        accounts = self.conn.execute("SELECT trader, cash, position, checked_at FROM accounts WHERE perpetual = ?", (key,)).fetchall()
+        index.engine.restore([bytes(account[0]) for account in accounts], [account[1] for account in accounts],
+                             [account[2] for account in accounts], [account[3] for account in accounts])
+        index.block_number, index.synced_at = row
+        return True
+
+    def pending(self) -> list:
+        """Returns (perpetual key, tx hash, trader, sent at) of the saved pending transactions."""
+        return [(row[1], bytes(row[0]), bytes(row[2]), row[3]) for row in self.conn.execute("SELECT * FROM pending")]
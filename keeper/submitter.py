@@ -0,0 +1,301 @@
+import logging
+import queue
+import threading
+import time
+
+from eth_account.signers.local import LocalAccount
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+import config
+from lib.address import Address
+from lib.nonce_manager import NonceManager
+from .gas_strategy import GasStrategy
+from .metrics import GAS_PRICE, LIQUIDATION_RECEIPT_SECONDS, LIQUIDATION_SEND_SECONDS, LIQUIDATIONS, REPLACEMENTS
+
+
+class Liquidation:
+    def __init__(self, pool, perpetual_index: int, trader: bytes, on_done=None):
+        self.pool = pool
+        self.perpetual_index = perpetual_index
+        self.trader = trader
+        # called with the transaction status, 0 if the simulation failed and None if it was never confirmed
+        self.on_done = on_done
+        self.detected_at = time.time()
+        # max fee worth paying in wei, None for no limit
+        self.max_gas_cost = None
+        # signed fields but gasPrice, kept to replace the transaction
+        self.tx = None
+        self.gas_price = None
+        # hashes of the transaction and its replacements, tx_hash is the latest
+        self.tx_hashes = []
+        self.tx_hash = None
+        self.sent_at = None
+        self.replaced_at = None
+        self.replacements = 0
+
+    @property
+    def key(self):
+        return (self.pool.address.address, self.perpetual_index, self.trader)
+
+
+class Submitter:
+    """Liquidation submission pipeline.
+
+    Detected liquidations are queued. A sender thread simulates all queued
+    liquidations in one batch against the pending block, then signs those that
+    would succeed with local nonces and sends them back to back. A tracker
+    thread polls the receipts of all pending transactions together, and
+    replaces a transaction not mined within replace_interval seconds by the
+    same nonce at a higher gas price.
+    """
+    logger = logging.getLogger()
+
+    def __init__(self, web3: Web3, account: LocalAccount, gas_strategy: GasStrategy, max_batch_size: int = 100,
+                 replace_interval: float = 15, bump_ratio: float = 0.125, max_replacements: int = 5, gas_margin: float = 1.2):
+        assert(isinstance(web3, Web3))
+        assert(isinstance(gas_strategy, GasStrategy))
+
+        self.web3 = web3
+        self.account = account
+        self.gas_strategy = gas_strategy
+        self.max_batch_size = max_batch_size
+        self.replace_interval = replace_interval
+        self.bump_ratio = bump_ratio
+        self.max_replacements = max_replacements
+        # gas limit over the estimate
+        self.gas_margin = gas_margin
+        self.nonce_manager = NonceManager(web3, Address(account.address))
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        # liquidation key -> Liquidation, from submit until confirmed or dropped
+        self.liquidations = {}
+        # tx hash -> Liquidation, sent and waiting for receipt, replacements included
+        self.pending = {}
+        self.chain_id = None
+        self.threads = []
+
+    def start(self):
+        for target in (self._send_loop, self._track_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, liquidation: Liquidation) -> bool:
+        """Queue a liquidation, returns False if the same one is already in flight."""
+        with self.lock:
+            if liquidation.key in self.liquidations:
+                return False
+            self.liquidations[liquidation.key] = liquidation
+        self.queue.put(liquidation)
+        return True
+
+    def track(self, liquidation: Liquidation):
+        """Wait for the receipt of a liquidation sent before, e.g. by a previous run."""
+        assert(liquidation.tx_hash is not None)
+        liquidation.tx_hashes = [liquidation.tx_hash]
+        with self.lock:
+            self.liquidations[liquidation.key] = liquidation
+            self.pending[liquidation.tx_hash] = liquidation
+
+    def pending_liquidations(self) -> list:
+        with self.lock:
+            return list(dict((id(liquidation), liquidation) for liquidation in self.pending.values()).values())
+
+    def _send_loop(self):
+        while True:
+            liquidations = [self.queue.get()]
+            # whatever was queued meanwhile is simulated in the same batch
+            while len(liquidations) < self.max_batch_size:
+                try:
+                    liquidations.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._send_batch(liquidations)
+            except Exception as e:
+                for liquidation in liquidations:
+                    if liquidation.tx_hash is None:
+                        self.logger.fatal(f"liquidate failed. address:{Address(liquidation.trader)} error:{e}")
+                        self._done(liquidation, None)
+
+    def _send_batch(self, liquidations: list):
+        if self.chain_id is None:
+            self.chain_id = self.web3.eth.chainId
+        txs = []
+        for liquidation in liquidations:
+            call = liquidation.pool.liquidate_by_amm_call(liquidation.perpetual_index, liquidation.trader)
+            txs.append(dict(call.params(), **{'from': self.account.address}))
+        for liquidation, tx, gas in zip(liquidations, txs, self._simulate(txs)):
+            if isinstance(gas, Exception):
+                # liquidated by someone else or safe again, not worth a failed transaction
+                self.logger.info(f"liquidate skipped. address:{Address(liquidation.trader)} simulation error:{gas}")
+                self._done(liquidation, 0, 'skipped')
+                continue
+            try:
+                self._send(liquidation, tx, gas)
+            except Exception as e:
+                self.logger.fatal(f"liquidate failed. address:{Address(liquidation.trader)} error:{e}")
+                self._done(liquidation, None)
+
+    def _simulate(self, txs: list) -> list:
+        """Estimate gas of all transactions against the pending block, returns the gas or the error of each."""
+        provider = self.web3.provider
+        if hasattr(provider, 'make_batch_request'):
+            responses = provider.make_batch_request([('eth_estimateGas', [tx, 'pending']) for tx in txs])
+            return [ValueError(response['error']) if 'error' in response else int(response['result'], 16) for response in responses]
+        results = []
+        for tx in txs:
+            try:
+                results.append(self.web3.eth.estimateGas(tx))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def _send(self, liquidation: Liquidation, tx: dict, gas: int):
+        tx = dict(tx)
+        del tx['from']
+        tx['gas'] = int(gas * self.gas_margin)
+        tx['value'] = 0
+        tx['chainId'] = self.chain_id
+        gas_price = self.gas_strategy.price()
+        if liquidation.max_gas_cost is not None and liquidation.max_gas_cost // tx['gas'] < gas_price:
+            # under the market price it would sit in the mempool, holding back the later nonces
+            self.logger.info(f"liquidate skipped. address:{Address(liquidation.trader)} gas price:{gas_price} "
+                             f"over reward cap:{liquidation.max_gas_cost // tx['gas']}")
+            self._done(liquidation, 0, 'skipped')
+            return
+        tx['nonce'] = self.nonce_manager.next()
+        try:
+            tx_hash = self._sign_and_send(tx, gas_price)
+        except Exception:
+            # the nonce may not have been used, read it from the node again
+            self.nonce_manager.reset()
+            raise
+        liquidation.tx = tx
+        liquidation.gas_price = gas_price
+        liquidation.tx_hash = tx_hash
+        liquidation.tx_hashes.append(tx_hash)
+        liquidation.sent_at = liquidation.replaced_at = time.time()
+        LIQUIDATION_SEND_SECONDS.observe(liquidation.sent_at - liquidation.detected_at)
+        GAS_PRICE.set(gas_price / 1e9)
+        with self.lock:
+            self.pending[tx_hash] = liquidation
+        self.logger.info(f"liquidate sent. address:{Address(liquidation.trader)} tx_hash:{self.web3.toHex(tx_hash)} nonce:{tx['nonce']} gas_price:{gas_price}")
+
+    def _sign_and_send(self, tx: dict, gas_price: int):
+        signed_tx = self.account.sign_transaction(dict(tx, gasPrice=gas_price))
+        return self.web3.eth.sendRawTransaction(signed_tx.rawTransaction)
+
+    def _replace(self, liquidation: Liquidation):
+        gas_price = self.gas_strategy.bump(liquidation.gas_price, self.bump_ratio)
+        if gas_price is not None and liquidation.max_gas_cost is not None:
+            gas_price = min(gas_price, liquidation.max_gas_cost // liquidation.tx['gas'])
+        # at max_price or the reward cap, or under the 10% bump nodes accept
+        if gas_price is None or gas_price < liquidation.gas_price * 1.1:
+            return
+        liquidation.replaced_at = time.time()
+        liquidation.replacements += 1
+        try:
+            tx_hash = self._sign_and_send(liquidation.tx, gas_price)
+        except Exception as e:
+            # e.g. the nonce is used as the previous transaction was just mined
+            self.logger.warning(f"replace liquidation error. address:{Address(liquidation.trader)} nonce:{liquidation.tx['nonce']} error:{e}")
+            if 'nonce too low' in str(e).lower():
+                self.nonce_manager.reset()
+            return
+        liquidation.gas_price = gas_price
+        liquidation.tx_hash = tx_hash
+        liquidation.tx_hashes.append(tx_hash)
+        REPLACEMENTS.inc()
+        GAS_PRICE.set(gas_price / 1e9)
+        with self.lock:
+            self.pending[tx_hash] = liquidation
+        self.logger.info(f"liquidate replaced. address:{Address(liquidation.trader)} tx_hash:{self.web3.toHex(tx_hash)} nonce:{liquidation.tx['nonce']} gas_price:{gas_price}")
+
+    def _receipts(self, tx_hashes: list) -> list:
+        """Receipts of tx_hashes in batches, None if not mined yet or the error of each."""
+        provider = self.web3.provider
+        if not hasattr(provider, 'make_batch_request'):
+            results = []
+            for tx_hash in tx_hashes:
+                try:
+                    results.append(self.web3.eth.getTransactionReceipt(tx_hash))
+                except TransactionNotFound:
+                    results.append(None)
+                except Exception as e:
+                    results.append(e)
+            return results
+        results = []
+        for i in range(0, len(tx_hashes), self.max_batch_size):
+            chunk = tx_hashes[i:i+self.max_batch_size]
+            try:
+                responses = provider.make_batch_request([('eth_getTransactionReceipt', [self.web3.toHex(tx_hash)]) for tx_hash in chunk])
+            except Exception as e:
+                results += [e] * len(chunk)
+                continue
+            for response in responses:
+                if 'error' in response:
+                    results.append(ValueError(response['error']))
+                elif response.get('result') is None:
+                    results.append(None)
+                else:
+                    receipt = dict(response['result'])
+                    receipt['status'] = int(receipt['status'], 16)
+                    results.append(receipt)
+        return results
+
+    def _track_loop(self):
+        timeout = 10 * int(config.TX_TIMEOUT)
+        while True:
+            time.sleep(config.RECEIPT_POLL_INTERVAL)
+            with self.lock:
+                pending = list(self.pending.items())
+            if len(pending) == 0:
+                continue
+            try:
+                receipts = self._receipts([tx_hash for tx_hash, _ in pending])
+            except Exception as e:
+                self.logger.warning(f"get transaction receipts error:{e}")
+                continue
+            for (tx_hash, liquidation), tx_receipt in zip(pending, receipts):
+                with self.lock:
+                    if tx_hash not in self.pending:
+                        # done through another transaction of the same nonce
+                        continue
+                if isinstance(tx_receipt, Exception):
+                    self.logger.warning(f"get transaction receipt error:{tx_receipt}")
+                    continue
+
+                if tx_receipt is not None:
+                    self.logger.info(tx_receipt)
+                    status = tx_receipt['status']
+                    LIQUIDATION_RECEIPT_SECONDS.observe(time.time() - liquidation.detected_at)
+                    if status == 1:
+                        self.logger.info(f"liquidate success. address:{Address(liquidation.trader)}")
+                    else:
+                        self.logger.info(f"liquidate fail. address:{Address(liquidation.trader)}")
+                    self._done(liquidation, status)
+                elif tx_hash != liquidation.tx_hash:
+                    # only the latest transaction is replaced or timed out
+                    continue
+                elif time.time() - liquidation.sent_at > timeout:
+                    self.logger.warning(f"liquidate not confirmed in {timeout}s. address:{Address(liquidation.trader)} tx_hash:{self.web3.toHex(tx_hash)}")
+                    self._done(liquidation, None)
+                elif liquidation.tx is not None and liquidation.replacements < self.max_replacements \
+                        and time.time() - liquidation.replaced_at >= self.replace_interval:
+                    self._replace(liquidation)
+
+    def _done(self, liquidation: Liquidation, status, result=None):
+        if result is None:
+            result = 'dropped' if status is None else 'success' if status == 1 else 'fail'
+        LIQUIDATIONS.labels(result).inc()
+        if status is None and liquidation.tx_hash is not None:
+            # a dropped transaction may leave a nonce gap that holds back the later ones
+            self.nonce_manager.reset()
+        with self.lock:
+            self.liquidations.pop(liquidation.key, None)
+            for tx_hash in liquidation.tx_hashes:
+                self.pending.pop(tx_hash, None)
+        if liquidation.on_done is not None:
+            liquidation.on_done(status)
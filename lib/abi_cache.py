@@ -0,0 +1,79 @@
+import json
+import logging
+import os
+import pickle
+
+from eth_utils import encode_hex, event_abi_to_log_topic, function_abi_to_4byte_selector
+from web3._utils.abi import get_abi_input_types, get_abi_output_types
+
+logger = logging.getLogger()
+
+# bump when the cached entry layout changes
+_VERSION = 2
+# id(abi) -> entry, for the ABIs loaded through load_abi
+_entries = {}
+
+
+def _parse(path: str) -> dict:
+    with open(path, 'rb') as f:
+        abi = json.loads(f.read())
+    functions = {}
+    events = {}
+    for item in abi:
+        if item['type'] == 'function':
+            functions[item['name']] = (function_abi_to_4byte_selector(item), get_abi_input_types(item), get_abi_output_types(item))
+        elif item['type'] == 'event':
+            # topic -> name, overloaded events have one topic per signature
+            events[encode_hex(event_abi_to_log_topic(item))] = item['name']
+    return {'abi': abi, 'functions': functions, 'events': events}
+
+
+def load_abi(path: str) -> list:
+    """Parsed ABI of the JSON file at path, with its selectors and event topics.
+
+    The result is pickled to __pycache__ next to the file, like compiled
+    modules, and read from there while the file's size and mtime match.
+    """
+    stat = os.stat(path)
+    stamp = (_VERSION, stat.st_size, stat.st_mtime_ns)
+    cache_path = os.path.join(os.path.dirname(path), '__pycache__', os.path.basename(path) + '.pickle')
+    entry = None
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+        if cached['stamp'] == stamp:
+            entry = cached
+    except Exception:
+        pass
+    if entry is None:
+        entry = _parse(path)
+        entry['stamp'] = stamp
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, cache_path)
+        except Exception as e:
+            # e.g. a read-only install, parse again next time
+            logger.debug(f"write abi cache {cache_path} error:{e}")
+    _entries[id(entry['abi'])] = entry
+    return entry['abi']
+
+
+def function_types(abi: list, name: str) -> tuple:
+    """(selector, input types, output types) of function name."""
+    entry = _entries.get(id(abi))
+    if entry is not None and name in entry['functions']:
+        return entry['functions'][name]
+    fn_abi = next(item for item in abi if item['type'] == 'function' and item['name'] == name)
+    return function_abi_to_4byte_selector(fn_abi), get_abi_input_types(fn_abi), get_abi_output_types(fn_abi)
+
+
+def event_topics(abi: list, names: list) -> dict:
+    """topic -> name of the events in names."""
+    entry = _entries.get(id(abi))
+    if entry is not None:
+        return dict((topic, name) for topic, name in entry['events'].items() if name in names)
+    return dict((encode_hex(event_abi_to_log_topic(item)), item['name'])
+                for item in abi if item['type'] == 'event' and item['name'] in names)
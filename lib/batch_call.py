@@ -0,0 +1,72 @@
+import logging
+
+from hexbytes import HexBytes
+from web3 import Web3
+
+
+class BatchCaller:
+    """Make many FastCalls in a few round trips.
+
+    Calls go through the multicall contract when one is given, otherwise as
+    JSON-RPC batch requests, falling back to one call each when the provider
+    does not support batches.
+    """
+    logger = logging.getLogger()
+
+    def __init__(self, web3: Web3, multicall=None, max_batch_size: int = 100):
+        assert(isinstance(web3, Web3))
+        assert(max_batch_size > 0)
+
+        self.web3 = web3
+        self.multicall = multicall
+        self.max_batch_size = max_batch_size
+
+    def call(self, calls: list) -> list:
+        """Returns the decoded results, raises the first error."""
+        results = self.try_call(calls)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    def try_call(self, calls: list) -> list:
+        """Returns the decoded result or the exception of each call.
+
+        A multicall chunk that fails is made again as separate calls, so that
+        one reverting call does not fail the others.
+        """
+        results = []
+        for i in range(0, len(calls), self.max_batch_size):
+            chunk = calls[i:i+self.max_batch_size]
+            if self.multicall is not None:
+                try:
+                    results += self.multicall.aggregate(chunk)
+                    continue
+                except Exception as e:
+                    self.logger.debug(f"multicall aggregate error:{e}, call one by one")
+            if hasattr(self.web3.provider, 'make_batch_request'):
+                results += self._batch(chunk)
+            else:
+                results += [self._call(call) for call in chunk]
+        return results
+
+    def _call(self, call):
+        try:
+            return call.call(self.web3)
+        except Exception as e:
+            return e
+
+    def _batch(self, calls: list) -> list:
+        try:
+            responses = self.web3.provider.make_batch_request([('eth_call', [call.params(), 'latest']) for call in calls])
+        except Exception as e:
+            return [e] * len(calls)
+        results = []
+        for call, response in zip(calls, responses):
+            try:
+                if 'error' in response:
+                    raise ValueError(response['error'])
+                results.append(call.decode(HexBytes(response['result'])))
+            except Exception as e:
+                results.append(e)
+        return results
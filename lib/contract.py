@@ -1,14 +1,16 @@
 import logging
-import json
-import pkg_resources
+import os
+import sys
 
-import eth_utils
 from web3 import Web3
+from .abi_cache import load_abi
 from .address import Address
 
 
 class Contract:
     logger = logging.getLogger()
+    # (web3, abi, address) -> web3 contract, shared by all wrappers of the same contract
+    _contracts = {}
 
     @staticmethod
     def _get_contract(web3: Web3, abi: list, address: Address):
@@ -21,8 +23,16 @@ class Contract:
         # if (code == "0x") or (code == "0x0") or (code == b"\x00") or (code is None):
         #     raise Exception(f"No contract found at {address}")
 
-        return web3.eth.contract(address=address.address, abi=abi)
+        key = (id(web3), id(abi), address.address)
+        if key not in Contract._contracts:
+            Contract._contracts[key] = web3.eth.contract(address=address.address, abi=abi)
+        return Contract._contracts[key]
+
+    @property
+    def contract(self):
+        # web3 contract objects are slow to build and only used off the hot path, build on first use
+        return self._get_contract(self.web3, self.abi, self.address)
 
     @staticmethod
     def _load_abi(package, resource) -> list:
-        return json.loads(pkg_resources.resource_string(package, resource))
+        return load_abi(os.path.join(os.path.dirname(sys.modules[package].__file__), resource))
@@ -0,0 +1,66 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class SqliteCoordinator:
+    """Member leases and claims shared by keeper processes through a SQLite file.
+
+    Members renew a lease with heartbeat and are live until it expires. A claim
+    on a key is held by one member until its ttl runs out or it is released.
+    Any coordinator with the same methods, e.g. backed by a network service, can
+    replace it for keepers on different hosts.
+    """
+    def __init__(self, path: str, member_id: str):
+        self.member_id = member_id
+        directory = os.path.dirname(path)
+        if directory != '':
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        # autocommit, transactions are opened explicitly
+        self.conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        with self.lock:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS members (id TEXT PRIMARY KEY, expires_at REAL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS claims (key TEXT PRIMARY KEY, owner TEXT, expires_at REAL)")
+
+    def heartbeat(self, ttl: float):
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute("INSERT OR REPLACE INTO members VALUES (?, ?)", (self.member_id, now + ttl))
+                self.conn.execute("DELETE FROM members WHERE expires_at < ?", (now,))
+                self.conn.execute("DELETE FROM claims WHERE expires_at < ?", (now,))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def members(self) -> list:
+        with self.lock:
+            rows = self.conn.execute("SELECT id FROM members WHERE expires_at >= ?", (time.time(),)).fetchall()
+        return sorted(row[0] for row in rows)
+
+    def leave(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM members WHERE id = ?", (self.member_id,))
+
+    def claim(self, key: str, ttl: float) -> bool:
+        """Returns True if this member holds the claim on key now, renewing its own claim."""
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute("DELETE FROM claims WHERE key = ? AND (expires_at < ? OR owner = ?)", (key, now, self.member_id))
+                self.conn.execute("INSERT OR IGNORE INTO claims VALUES (?, ?, ?)", (key, self.member_id, now + ttl))
+                owner = self.conn.execute("SELECT owner FROM claims WHERE key = ?", (key,)).fetchone()[0]
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return owner == self.member_id
+
+    def release(self, key: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM claims WHERE key = ? AND owner = ?", (key, self.member_id))
@@ -0,0 +1,49 @@
+from eth_abi import decode_abi, encode_abi
+from hexbytes import HexBytes
+from web3 import Web3
+
+from .abi_cache import function_types
+
+
+class FastFunction:
+    """A contract function encoded and decoded directly with eth_abi.
+
+    The selector and argument types are computed once, calls skip web3's
+    function lookup, argument normalization and middlewares. Decoded values
+    are not normalized: addresses come back as lowercase hex strings.
+    """
+    def __init__(self, abi: list, name: str):
+        self.name = name
+        self.selector, self.input_types, self.output_types = function_types(abi, name)
+
+    def encode(self, *args) -> bytes:
+        return self.selector + encode_abi(self.input_types, args)
+
+    def decode(self, data: bytes):
+        result = decode_abi(self.output_types, data)
+        return result[0] if len(result) == 1 else result
+
+    def __call__(self, address: str, *args):
+        return FastCall(self, address, self.encode(*args))
+
+
+class FastCall:
+    """A FastFunction call bound to a contract address and arguments."""
+    __slots__ = ('function', 'address', 'data')
+
+    def __init__(self, function: FastFunction, address: str, data: bytes):
+        self.function = function
+        self.address = address
+        self.data = data
+
+    def params(self) -> dict:
+        return {'to': self.address, 'data': '0x' + self.data.hex()}
+
+    def decode(self, data: bytes):
+        return self.function.decode(data)
+
+    def call(self, web3: Web3, block_identifier='latest'):
+        response = web3.provider.make_request('eth_call', [self.params(), block_identifier])
+        if 'error' in response:
+            raise ValueError(response['error'])
+        return self.decode(HexBytes(response['result']))
@@ -0,0 +1,55 @@
+import atexit
+import logging
+import logging.config
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+from .metrics import Counter
+
+LOG_DROPPED = Counter('keeper_log_dropped_total', "Log records dropped because the log queue was full")
+
+_listener = None
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Never blocks the caller for records under WARNING, drops them if the queue is full."""
+    def enqueue(self, record):
+        if record.levelno >= logging.WARNING:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc()
+
+
+def configure_logging(log_config: dict, queue_size: int = 10000):
+    """Applies log_config, then moves the root handlers to a background thread.
+
+    Callers only put records on a queue of queue_size, formatting and writing
+    to stdout and files happen in the listener thread. The queue is flushed
+    at exit.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    logging.config.dictConfig(log_config)
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    if len(handlers) == 0:
+        return
+    for handler in handlers:
+        root.removeHandler(handler)
+    log_queue = queue.Queue(queue_size)
+    root.addHandler(_DroppingQueueHandler(log_queue))
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop():
+    if _listener is not None:
+        _listener.stop()
+
+
+atexit.register(_stop)
@@ -0,0 +1,184 @@
+import bisect
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = []
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+
+    def expose(self) -> str:
+        """Returns all metrics in the Prometheus text format."""
+        with self.lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines += metric.samples()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def _labels(names, values, extra=None) -> str:
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if len(pairs) == 0:
+        return ""
+    return "{" + ",".join('%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"')) for name, value in pairs) + "}"
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name: str, documentation: str, labelnames=(), registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        # label values -> child
+        self.children = {}
+        if len(self.labelnames) == 0:
+            self.children[()] = self._child()
+        registry.register(self)
+
+    def labels(self, *values):
+        assert(len(values) == len(self.labelnames))
+        values = tuple(str(value) for value in values)
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self._child())
+        return child
+
+    def _child(self):
+        raise NotImplementedError
+
+    def samples(self) -> list:
+        with self.lock:
+            children = list(self.children.items())
+        lines = []
+        for values, child in children:
+            lines += child.samples(self.name, self.labelnames, values)
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        with self.lock:
+            self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def samples(self, name, labelnames, values) -> list:
+        return [f"{name}{_labels(labelnames, values)} {self.value}"]
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def _child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self.children[()].inc(amount)
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def _child(self):
+        return _Value()
+
+    def set(self, value: float):
+        self.children[()].set(value)
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+
+    def samples(self, name, labelnames, values) -> list:
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(list(self.buckets) + ['+Inf'], counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(labelnames, values, ('le', bound))} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labelnames, values)} {total}")
+        lines.append(f"{name}_count{_labels(labelnames, values)} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS, registry: Registry = REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.children[()].observe(value)
+
+
+def start_http_server(port: int, addr: str = '127.0.0.1', registry: Registry = REGISTRY, status=None):
+    """Serve the registry on http://addr:port/metrics from a daemon thread.
+
+    With a status callable returning a dict with ready and healthy flags,
+    /ready and /health answer the dict as JSON, with 503 when the flag is false.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split('?')[0]
+            if status is not None and path in ('/ready', '/health'):
+                values = status()
+                data = json.dumps(values).encode('utf-8')
+                self.send_response(200 if values['ready' if path == '/ready' else 'healthy'] else 503)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+            data = registry.expose().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((addr, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
@@ -0,0 +1,30 @@
+import threading
+
+from web3 import Web3
+
+from .address import Address
+
+
+class NonceManager:
+    """Hands out transaction nonces locally instead of asking the node for each transaction."""
+    def __init__(self, web3: Web3, address: Address):
+        assert(isinstance(web3, Web3))
+        assert(isinstance(address, Address))
+
+        self.web3 = web3
+        self.address = address
+        self.lock = threading.Lock()
+        self.nonce = None
+
+    def next(self) -> int:
+        with self.lock:
+            if self.nonce is None:
+                self.nonce = self.web3.eth.getTransactionCount(self.address.address, 'pending')
+            nonce = self.nonce
+            self.nonce += 1
+            return nonce
+
+    def reset(self):
+        """Forget the local nonce, the next one is read from the node again."""
+        with self.lock:
+            self.nonce = None
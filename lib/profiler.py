@@ -0,0 +1,75 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads while a wrapped callback runs.
+
+    Samples are aggregated as collapsed stacks ("thread;outer;inner count" per
+    line), the input format of flamegraph tools, and written to path at most
+    every dump_interval seconds.
+    """
+    logger = logging.getLogger()
+
+    def __init__(self, path: str, interval: float = 0.005, dump_interval: float = 60):
+        self.path = path
+        self.interval = interval
+        self.dump_interval = dump_interval
+        self.stacks = Counter()
+        self.lock = threading.Lock()
+        # callbacks being profiled
+        self.active = 0
+        self.dumped_at = time.time()
+        self.thread = threading.Thread(target=self._sample_loop, daemon=True, name="profiler")
+        self.thread.start()
+
+    def wrap(self, callback):
+        def profiled(*args, **kwargs):
+            with self.lock:
+                self.active += 1
+            try:
+                return callback(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.active -= 1
+                if time.time() - self.dumped_at >= self.dump_interval:
+                    self.dump()
+        return profiled
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            if self.active == 0:
+                continue
+            names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+            samples = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                samples.append(";".join(reversed(stack)))
+            with self.lock:
+                self.stacks.update(samples)
+
+    def dump(self):
+        with self.lock:
+            stacks = list(self.stacks.items())
+        tmp = self.path + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                for stack, count in stacks:
+                    f.write(f"{stack} {count}\n")
+            os.replace(tmp, self.path)
+        except Exception as e:
+            self.logger.warning(f"write profile error:{e}")
+        self.dumped_at = time.time()
@@ -0,0 +1,245 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from web3 import HTTPProvider
+from web3._utils.encoding import FriendlyJsonSerde
+from web3.providers.base import JSONBaseProvider
+
+from .metrics import Counter, Histogram
+
+RPC_SECONDS = Histogram('keeper_rpc_seconds', "JSON-RPC request latency, batch requests as method batch", ['method'])
+RPC_ERRORS = Counter('keeper_rpc_errors_total', "Failed JSON-RPC requests", ['method'])
+RPC_HEDGED = Counter('keeper_rpc_hedged_total', "JSON-RPC requests sent to another endpoint, after a deadline or an error", ['method'])
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """HTTPProvider on its own keep-alive session.
+
+    At most max_connections requests are in flight to the endpoint, extra
+    callers block until a pooled connection is free.
+    """
+    def __init__(self, endpoint_uri: str, max_connections: int = 10, request_kwargs=None):
+        super().__init__(endpoint_uri=endpoint_uri, request_kwargs=request_kwargs)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def make_request(self, method, params):
+        self.logger.debug("Making request HTTP. URI: %s, Method: %s", self.endpoint_uri, method)
+        request_data = self.encode_rpc_request(method, params)
+        response = self.decode_rpc_response(self._post(request_data, method))
+        if 'error' in response:
+            RPC_ERRORS.labels(method).inc()
+        return response
+
+    def make_batch_request(self, calls: list) -> list:
+        """Send (method, params) pairs as one JSON-RPC batch, returns the responses in the same order."""
+        batch = [{
+            'jsonrpc': '2.0',
+            'method': method,
+            'params': params or [],
+            'id': next(self.request_counter),
+        } for method, params in calls]
+        self.logger.debug("Making batch request HTTP. URI: %s, Size: %d", self.endpoint_uri, len(batch))
+        responses = self.decode_rpc_response(self._post(FriendlyJsonSerde().json_encode(batch).encode('utf-8'), 'batch'))
+        if not isinstance(responses, list):
+            # the node rejected the whole batch
+            raise ValueError(responses.get('error', responses))
+        responses = dict((response.get('id'), response) for response in responses)
+        return [responses.get(request['id'], {'error': 'missing response'}) for request in batch]
+
+    def _post(self, request_data: bytes, method: str) -> bytes:
+        kwargs = self.get_request_kwargs()
+        kwargs.setdefault('timeout', 10)
+        start = time.time()
+        try:
+            raw_response = self.session.post(self.endpoint_uri, data=request_data, **kwargs)
+            raw_response.raise_for_status()
+        except Exception:
+            RPC_ERRORS.labels(method).inc()
+            raise
+        finally:
+            RPC_SECONDS.labels(method).observe(time.time() - start)
+        return raw_response.content
+
+
+class _Endpoint:
+    """Latency and health of one endpoint of a MultiHTTPProvider."""
+    def __init__(self, provider: PooledHTTPProvider, samples: int):
+        self.provider = provider
+        self.samples = samples
+        self.lock = threading.Lock()
+        # method -> latencies of the last successful requests
+        self.latencies = {}
+        self.failures = 0
+        self.down_until = 0
+        # latest block number the endpoint answered
+        self.head = 0
+
+    def quantile(self, method: str, q: float, min_samples: int = 1):
+        with self.lock:
+            latencies = self.latencies.get(method)
+            if latencies is None or len(latencies) < min_samples:
+                return None
+            latencies = sorted(latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+
+    def success(self, method: str, seconds: float):
+        with self.lock:
+            self.latencies.setdefault(method, deque(maxlen=self.samples)).append(seconds)
+            self.failures = 0
+
+    def seen(self, method: str, params, response):
+        result = response.get('result') if isinstance(response, dict) else None
+        if result is None:
+            return
+        if method == 'eth_blockNumber':
+            head = int(result, 16)
+        elif method == 'eth_getBlockByNumber' and params[0] == 'latest':
+            head = int(result['number'], 16)
+        else:
+            return
+        with self.lock:
+            self.head = max(self.head, head)
+
+    def failure(self, max_failures: int, cooldown: float):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= max_failures:
+                self.down_until = time.time() + cooldown
+
+
+class MultiHTTPProvider(JSONBaseProvider):
+    """Provider over several endpoints of the same chain.
+
+    Reads go to the healthy endpoint with the lowest median latency for the
+    method. If no response came within the p95 latency of that endpoint,
+    the request is hedged to the next endpoint and the first response wins.
+    Transport errors fail over to the next endpoint right away, JSON-RPC
+    errors are returned as they are. An endpoint failing max_failures times
+    in a row is skipped for cooldown seconds. Transactions are broadcast to
+    all endpoints.
+
+    Head requests go to all healthy endpoints and the first answer wins,
+    the others update the heads known of their endpoints. Other reads go to
+    the endpoints whose head is at the highest head seen, so that logs and
+    calls for a block do not come from an endpoint behind it. Endpoints
+    behind are only tried once all of those failed.
+    """
+    logger = logging.getLogger()
+
+    BROADCAST_METHODS = ('eth_sendRawTransaction',)
+    # answers do not depend on the head of the endpoint
+    UNPINNED_METHODS = ('eth_chainId', 'net_version', 'web3_clientVersion')
+
+    def __init__(self, endpoint_uris: list, max_connections: int = 10, hedge_delay: float = 1, min_hedge_delay: float = 0.05,
+                 max_failures: int = 3, cooldown: float = 30, samples: int = 200):
+        assert(len(endpoint_uris) > 0)
+        super().__init__()
+        # one key for the page sizes learned across endpoints
+        self.endpoint_uri = ",".join(endpoint_uris)
+        self.endpoints = [_Endpoint(PooledHTTPProvider(uri, max_connections), samples) for uri in endpoint_uris]
+        # hedge delay while an endpoint has too few samples to tell its p95
+        self.hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.executor = ThreadPoolExecutor(max_workers=max_connections * len(endpoint_uris), thread_name_prefix="rpc")
+
+    def __str__(self):
+        return f"RPC connection {self.endpoint_uri}"
+
+    def _ordered(self, method: str, pinned: bool = False) -> tuple:
+        # endpoints to try in order, and endpoints behind the head to fail over to
+        now = time.time()
+
+        def score(endpoint):
+            # endpoints without samples are tried first to learn their latency
+            return (endpoint.down_until > now, endpoint.quantile(method, 0.5) or 0)
+        endpoints = sorted(self.endpoints, key=score)
+        if not pinned:
+            return endpoints, []
+        head = max((endpoint.head for endpoint in endpoints if endpoint.down_until <= now), default=0)
+        return [endpoint for endpoint in endpoints if endpoint.head >= head], [endpoint for endpoint in endpoints if endpoint.head < head]
+
+    @staticmethod
+    def _is_head(method: str, params) -> bool:
+        return method == 'eth_blockNumber' or (method == 'eth_getBlockByNumber' and params[0] == 'latest')
+
+    def _delay(self, endpoint: _Endpoint, method: str) -> float:
+        p95 = endpoint.quantile(method, 0.95, 20)
+        return self.hedge_delay if p95 is None else max(self.min_hedge_delay, p95)
+
+    def _request(self, endpoint: _Endpoint, method: str, request, params=None):
+        start = time.time()
+        try:
+            response = request(endpoint.provider)
+        except Exception as e:
+            endpoint.failure(self.max_failures, self.cooldown)
+            self.logger.warning(f"rpc request error. endpoint:{endpoint.provider.endpoint_uri} method:{method} error:{e}")
+            raise
+        endpoint.success(method, time.time() - start)
+        if params is not None:
+            endpoint.seen(method, params, response)
+        return response
+
+    def _hedged(self, method: str, request, pinned: bool = True):
+        endpoints, failover = self._ordered(method, pinned)
+        futures = set()
+        error = None
+        next_at = 0
+        while True:
+            if len(endpoints) > 0 and time.time() >= next_at:
+                if len(futures) > 0:
+                    RPC_HEDGED.labels(method).inc()
+                endpoint = endpoints.pop(0)
+                futures.add(self.executor.submit(self._request, endpoint, method, request))
+                next_at = time.time() + self._delay(endpoint, method)
+            if len(futures) == 0:
+                raise error
+            done, futures = wait(futures, timeout=max(0, next_at - time.time()) if len(endpoints) > 0 else None,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+                # fail over without waiting for the deadline
+                next_at = 0
+                if len(endpoints) == 0:
+                    endpoints, failover = failover, []
+
+    def _broadcast(self, method: str, request, params=None):
+        now = time.time()
+        endpoints = [endpoint for endpoint in self.endpoints if endpoint.down_until <= now] or self.endpoints
+        futures = set(self.executor.submit(self._request, endpoint, method, request, params) for endpoint in endpoints)
+        response = None
+        error = None
+        while len(futures) > 0:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                elif 'error' not in future.result():
+                    # others may answer already known or nonce too low
+                    return future.result()
+                elif response is None:
+                    response = future.result()
+        if response is not None:
+            return response
+        raise error
+
+    def make_request(self, method, params):
+        request = lambda provider: provider.make_request(method, params)
+        if method in self.BROADCAST_METHODS or self._is_head(method, params):
+            return self._broadcast(method, request, params)
+        return self._hedged(method, request, method not in self.UNPINNED_METHODS)
+
+    def make_batch_request(self, calls: list) -> list:
+        return self._hedged('batch', lambda provider: provider.make_batch_request(calls))
@@ -0,0 +1,272 @@
+import atexit
+import bisect
+import gzip
+import json
+import logging
+import threading
+import time
+
+from eth_utils import keccak
+from web3.providers.base import JSONBaseProvider
+
+
+def _open(path: str, mode: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def _default(value):
+    if isinstance(value, (bytes, bytearray)):
+        return '0x' + bytes(value).hex()
+    if hasattr(value, 'items'):
+        return dict(value)
+    raise TypeError(f"{type(value)} is not JSON serializable")
+
+
+def _dumps(value, sort_keys: bool = False) -> str:
+    return json.dumps(value, separators=(',', ':'), sort_keys=sort_keys, default=_default)
+
+
+def read_records(path: str):
+    """Yields the records of a recording, a truncated end is skipped."""
+    with _open(path, 'r') as f:
+        try:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+        except EOFError:
+            # gzip stream of a process that did not exit cleanly
+            return
+
+
+class RecordingProvider(JSONBaseProvider):
+    """Wraps a provider and appends every request and response to path.
+
+    One JSON line per call: t start time, d seconds, b latest block seen when
+    the request started, m method, p params and r result or e error. Batch
+    requests are written as their calls, so that replays can batch them
+    differently. A path ending in .gz is gzip compressed.
+    """
+    logger = logging.getLogger()
+
+    def __init__(self, provider, path: str, flush_interval: float = 1):
+        super().__init__()
+        self.provider = provider
+        self.lock = threading.Lock()
+        self.file = _open(path, 'a')
+        self.flush_interval = flush_interval
+        self.flushed_at = time.time()
+        self.block_number = None
+        atexit.register(self.close)
+
+    @property
+    def endpoint_uri(self):
+        return getattr(self.provider, 'endpoint_uri', None)
+
+    def __str__(self):
+        return f"recording {self.provider}"
+
+    def _seen(self, method, params, response):
+        result = response.get('result')
+        if result is None:
+            return
+        if method == 'eth_blockNumber':
+            block_number = int(result, 16)
+        elif method == 'eth_getBlockByNumber' and params[0] == 'latest':
+            block_number = int(result['number'], 16)
+        else:
+            return
+        if self.block_number is None or block_number > self.block_number:
+            self.block_number = block_number
+
+    def _write(self, start: float, seconds: float, block_number, calls: list, responses: list):
+        lines = []
+        for (method, params), response in zip(calls, responses):
+            record = {'t': round(start, 3), 'd': round(seconds, 4), 'b': block_number, 'm': method, 'p': params}
+            if 'error' in response:
+                record['e'] = response['error']
+            else:
+                record['r'] = response.get('result')
+            lines.append(_dumps(record))
+        try:
+            with self.lock:
+                self.file.write("\n".join(lines) + "\n")
+                if time.time() - self.flushed_at >= self.flush_interval:
+                    self.file.flush()
+                    self.flushed_at = time.time()
+        except Exception as e:
+            self.logger.warning(f"write rpc recording error:{e}")
+
+    def make_request(self, method, params):
+        block_number = self.block_number
+        start = time.time()
+        response = self.provider.make_request(method, params)
+        self._seen(method, params, response)
+        self._write(start, time.time() - start, block_number, [(method, params)], [response])
+        return response
+
+    def make_batch_request(self, calls: list) -> list:
+        block_number = self.block_number
+        start = time.time()
+        responses = self.provider.make_batch_request(calls)
+        self._write(start, time.time() - start, block_number, calls, responses)
+        return responses
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+class ReplayProvider(JSONBaseProvider):
+    """Answers requests from a recording of RecordingProvider, as of block_number.
+
+    A call gets the response recorded for the same method and params at the
+    latest block not after block_number. eth_blockNumber and the latest
+    block follow block_number, eth_getLogs is answered from all recorded logs
+    for any block range. Transactions are not sent anywhere: they are kept in
+    sent with the block they were sent at and mined in the next block.
+    Gas estimation and nonces not in the recording succeed.
+    """
+    logger = logging.getLogger()
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.endpoint_uri = f"replay:{path}"
+        # (method, params) -> ([block numbers], [responses])
+        self.responses = {}
+        # block number -> latest block recorded at it
+        self.blocks = {}
+        self.logs = {}
+        self.recorded_blocks = set()
+        self.block_number = None
+        self.lock = threading.Lock()
+        # (block number, raw transaction)
+        self.sent = []
+        # tx hash -> block number it was sent at
+        self.receipts = {}
+        for record in read_records(path):
+            self._load(record)
+        for blocks, responses in self.responses.values():
+            order = sorted(range(len(blocks)), key=lambda i: blocks[i])
+            blocks[:] = [blocks[i] for i in order]
+            responses[:] = [responses[i] for i in order]
+        self.logs = sorted(self.logs.values(), key=lambda log: (int(log['blockNumber'], 16), int(log['logIndex'], 16)))
+
+    def __str__(self):
+        return f"RPC connection {self.endpoint_uri}"
+
+    @staticmethod
+    def _key(method, params) -> str:
+        return method + _dumps(params, sort_keys=True)
+
+    def _load(self, record: dict):
+        method = record['m']
+        result = record.get('r')
+        if method == 'eth_getLogs':
+            for log in result or []:
+                self.logs[(log['blockHash'], log['logIndex'])] = log
+            return
+        if method == 'eth_getBlockByNumber' and record['p'][0] == 'latest' and result is not None:
+            self.blocks[int(result['number'], 16)] = result
+            return
+        if method in ('eth_blockNumber', 'eth_sendRawTransaction', 'eth_getTransactionReceipt'):
+            return
+        if record.get('b') is not None:
+            self.recorded_blocks.add(record['b'])
+        response = {'error': record['e']} if 'e' in record else {'result': result}
+        blocks, responses = self.responses.setdefault(self._key(method, record['p']), ([], []))
+        # requests before the first block, e.g. eth_chainId, answer at any block
+        blocks.append(-1 if record.get('b') is None else record['b'])
+        responses.append(response)
+
+    def block_numbers(self) -> list:
+        """Blocks the recorded keeper worked on, in order."""
+        return sorted(self.recorded_blocks | set(self.blocks))
+
+    def _block(self) -> dict:
+        block = self.blocks.get(self.block_number)
+        if block is not None:
+            return block
+        return {'number': hex(self.block_number), 'hash': '0x%064x' % self.block_number, 'parentHash': '0x%064x' % (self.block_number - 1),
+                'timestamp': hex(int(time.time())), 'transactions': []}
+
+    def _get_logs(self, log_filter: dict) -> list:
+        def block(value, default):
+            if value is None or value == 'latest':
+                return default
+            return int(value, 16) if isinstance(value, str) else value
+        from_block = block(log_filter.get('fromBlock'), self.block_number)
+        to_block = min(block(log_filter.get('toBlock'), self.block_number), self.block_number)
+        addresses = log_filter.get('address')
+        if addresses is not None:
+            addresses = set(address.lower() for address in ([addresses] if isinstance(addresses, str) else addresses))
+        topics = log_filter.get('topics') or []
+        logs = []
+        for log in self.logs:
+            if not from_block <= int(log['blockNumber'], 16) <= to_block:
+                continue
+            if addresses is not None and log['address'].lower() not in addresses:
+                continue
+            if not all(topic is None or log['topics'][i] in (topic if isinstance(topic, list) else [topic])
+                       for i, topic in enumerate(topics) if i < len(log['topics'])):
+                continue
+            logs.append(log)
+        return logs
+
+    def _send(self, raw: str) -> str:
+        raw = _default(raw) if isinstance(raw, (bytes, bytearray)) else raw
+        tx_hash = '0x' + keccak(hexstr=raw).hex()
+        with self.lock:
+            self.sent.append((self.block_number, raw))
+            self.receipts.setdefault(tx_hash, self.block_number)
+        return tx_hash
+
+    def _receipt(self, tx_hash: str):
+        block_number = self.receipts.get(tx_hash)
+        if block_number is None or block_number >= self.block_number:
+            return None
+        return {
+            'transactionHash': tx_hash, 'transactionIndex': '0x0', 'blockNumber': hex(block_number + 1), 'blockHash': '0x' + '0' * 64,
+            'from': '0x' + '0' * 40, 'to': '0x' + '0' * 40, 'cumulativeGasUsed': '0x1', 'gasUsed': '0x1',
+            'contractAddress': None, 'logs': [], 'logsBloom': '0x' + '0' * 512, 'status': '0x1',
+        }
+
+    def _recorded(self, method, params):
+        recorded = self.responses.get(self._key(method, params))
+        if recorded is None:
+            return None
+        blocks, responses = recorded
+        i = bisect.bisect_right(blocks, self.block_number)
+        return responses[i - 1] if i > 0 else None
+
+    def _respond(self, method, params) -> dict:
+        if method == 'eth_blockNumber':
+            return {'result': hex(self.block_number)}
+        if method == 'eth_getBlockByNumber' and params[0] == 'latest':
+            return {'result': self._block()}
+        if method == 'eth_getLogs':
+            return {'result': self._get_logs(params[0])}
+        if method == 'eth_sendRawTransaction':
+            return {'result': self._send(params[0])}
+        if method == 'eth_getTransactionReceipt':
+            return {'result': self._receipt(params[0])}
+        response = self._recorded(method, params)
+        if response is not None:
+            return response
+        if method == 'eth_estimateGas':
+            return {'result': hex(500000)}
+        if method == 'eth_getTransactionCount':
+            return {'result': '0x0'}
+        return {'error': {'code': -32000, 'message': f"{method} not recorded before block {self.block_number}"}}
+
+    def make_request(self, method, params):
+        response = self._respond(method, params)
+        response.update(jsonrpc='2.0', id=next(self.request_counter))
+        return response
+
+    def make_batch_request(self, calls: list) -> list:
+        return [self.make_request(method, params) for method, params in calls]
@@ -3,10 +3,19 @@ from decimal import *
 
 
 _context = Context(prec=1000, rounding=ROUND_DOWN)
+_wad = 10**18
+
+
+def _div_round_down(numerator: int, denominator: int) -> int:
+    """Integer division rounding toward zero, same as ROUND_DOWN in _context."""
+    quotient = abs(numerator) // abs(denominator)
+    return quotient if (numerator < 0) == (denominator < 0) else -quotient
 
 
 @total_ordering
 class Wad:
+    __slots__ = ('value',)
+
     def __init__(self, value):
         if isinstance(value, Wad):
             self.value = value.value
@@ -44,16 +53,15 @@ class Wad:
 
     def __mul__(self, other):
         if isinstance(other, Wad):
-            result = Decimal(self.value) * Decimal(other.value) / (Decimal(10) ** Decimal(18))
-            return Wad(int(result.quantize(1, context=_context)))
+            return Wad(_div_round_down(self.value * other.value, _wad))
         elif isinstance(other, int):
-            return Wad(int((Decimal(self.value) * Decimal(other)).quantize(1, context=_context)))
+            return Wad(self.value * other)
         else:
             raise ArithmeticError
 
     def __truediv__(self, other):
         if isinstance(other, Wad):
-            return Wad(int((Decimal(self.value) * (Decimal(10) ** Decimal(18)) / Decimal(other.value)).quantize(1, context=_context)))
+            return Wad(_div_round_down(self.value * _wad, other.value))
         else:
             raise ArithmeticError
 
@@ -1,5 +1,63 @@
+import time
+# before the imports, they are part of the startup
+STARTED_AT = time.time()
+
+import logging
+import multiprocessing
+import signal
+import socket
 import sys
+
+import config
 from keeper import Keeper
+from lib.log import configure_logging
+
+
+def run_worker(worker, coordinator):
+    # spawned workers import config again, without the supervisor changes
+    config.SHARD_COORDINATOR = coordinator
+    # workers keep their own snapshot and metrics port, and their shard id across restarts
+    if config.SNAPSHOT_PATH:
+        config.SNAPSHOT_PATH = f"{config.SNAPSHOT_PATH}.{worker}"
+    if config.METRICS_PORT:
+        config.METRICS_PORT += worker
+    config.SHARD_ID = f"{config.SHARD_ID or socket.gethostname()}-{worker}"
+    Keeper(sys.argv[1:], started_at=time.time()).main()
+
+
+def run_workers():
+    if not config.SHARD_COORDINATOR:
+        config.SHARD_COORDINATOR = './shard/coordinator.db'
+    configure_logging(config.LOG_CONFIG, config.LOG_QUEUE_SIZE)
+    logger = logging.getLogger()
+    # forked workers could inherit a lock held by the log listener thread
+    context = multiprocessing.get_context('spawn')
+    processes = {}
+
+    def terminate(sig, frame):
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join()
+        sys.exit(0)
+    signal.signal(signal.SIGINT, terminate)
+    signal.signal(signal.SIGTERM, terminate)
+
+    while True:
+        for worker in range(config.SHARD_WORKERS):
+            process = processes.get(worker)
+            if process is not None and process.is_alive():
+                continue
+            if process is not None:
+                logger.warning(f"keeper worker {worker} exited with code {process.exitcode}, restarting")
+            process = context.Process(target=run_worker, args=(worker, config.SHARD_COORDINATOR), name=f"keeper-{worker}")
+            process.start()
+            processes[worker] = process
+        time.sleep(5)
+
 
 if __name__ == '__main__':
-    Keeper(sys.argv[1:]).main()
+    if config.SHARD_WORKERS > 1:
+        run_workers()
+    else:
+        Keeper(sys.argv[1:], started_at=STARTED_AT).main()
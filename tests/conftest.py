@@ -0,0 +1,16 @@
+import importlib.util
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+try:
+    import config
+except ImportError:
+    # a checkout has config.example until it is moved to config, see README
+    spec = importlib.util.spec_from_file_location('config', os.path.join(ROOT, 'config.example', '__init__.py'),
+                                                  submodule_search_locations=[os.path.join(ROOT, 'config.example')])
+    config = importlib.util.module_from_spec(spec)
+    sys.modules['config'] = config
+    spec.loader.exec_module(config)
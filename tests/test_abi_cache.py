@@ -0,0 +1,57 @@
+import json
+import os
+import shutil
+
+from eth_utils import encode_hex, event_abi_to_log_topic, function_abi_to_4byte_selector
+
+from contract.liquidity_pool import LiquidityPool, PERPETUAL_EVENTS
+from lib import abi_cache
+
+ABI_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'abis', 'LiquidityPool.abi')
+
+
+def expected_topics(abi: list, names: list) -> dict:
+    return dict((encode_hex(event_abi_to_log_topic(item)), item['name'])
+                for item in abi if item['type'] == 'event' and item['name'] in names)
+
+
+def test_overloaded_events_keep_all_topics():
+    with open(ABI_PATH) as f:
+        abi = json.load(f)
+    topics = expected_topics(abi, PERPETUAL_EVENTS)
+    assert list(topics.values()).count('CreatePerpetual') == 3
+    assert LiquidityPool.perpetual_event_topics == topics
+
+
+def test_cached_load_matches_parse(tmp_path):
+    path = str(tmp_path / 'LiquidityPool.abi')
+    shutil.copy(ABI_PATH, path)
+    first = abi_cache.load_abi(path)
+    assert os.path.exists(str(tmp_path / '__pycache__' / 'LiquidityPool.abi.pickle'))
+    # second load comes from the pickle
+    abi = abi_cache.load_abi(path)
+    assert abi == first
+    assert abi_cache.event_topics(abi, PERPETUAL_EVENTS) == expected_topics(abi, PERPETUAL_EVENTS)
+    fn_abi = next(item for item in abi if item['type'] == 'function' and item['name'] == 'getMarginAccount')
+    selector, input_types, output_types = abi_cache.function_types(abi, 'getMarginAccount')
+    assert selector == function_abi_to_4byte_selector(fn_abi)
+    assert input_types == ['uint256', 'address']
+
+
+def test_uncached_abi_falls_back():
+    with open(ABI_PATH) as f:
+        abi = json.load(f)
+    assert abi_cache.event_topics(abi, PERPETUAL_EVENTS) == expected_topics(abi, PERPETUAL_EVENTS)
+
+
+def test_stale_cache_is_parsed_again(tmp_path):
+    path = str(tmp_path / 'Small.abi')
+    with open(path, 'w') as f:
+        json.dump([{'type': 'event', 'name': 'A', 'anonymous': False, 'inputs': []}], f)
+    assert len(abi_cache.load_abi(path)) == 1
+    with open(path, 'w') as f:
+        json.dump([{'type': 'event', 'name': 'A', 'anonymous': False, 'inputs': []},
+                   {'type': 'event', 'name': 'B', 'anonymous': False, 'inputs': []}], f)
+    os.utime(path, ns=(0, 10**18))
+    abi = abi_cache.load_abi(path)
+    assert sorted(abi_cache.event_topics(abi, ['A', 'B']).values()) == ['A', 'B']
@@ -0,0 +1,69 @@
+"""GasStrategy against the mock node: fee history, fallbacks, caching and bumps."""
+import pytest
+from web3 import Web3
+
+from benchmark.mock_node import MockNode
+from keeper.gas_strategy import GasStrategy
+
+GWEI = 10**9
+
+
+@pytest.fixture
+def node():
+    node = MockNode(1, 1).start()
+    yield node
+    node.stop()
+
+
+@pytest.fixture
+def web3(node):
+    return Web3(Web3.HTTPProvider(node.url))
+
+
+def unsupported(node, monkeypatch, *methods):
+    handle = node.handle
+
+    def limited(request):
+        if request['method'] in methods:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': -32601, 'message': 'method not found'}}
+        return handle(request)
+    monkeypatch.setattr(node, 'handle', limited)
+
+
+def test_price_covers_a_base_fee_increase_and_the_tip(web3):
+    # mock base fee 1 gwei, tips 0.1 gwei
+    assert GasStrategy(web3, GWEI, 100 * GWEI, 50).price() == GWEI * 9 // 8 + GWEI // 10
+
+
+def test_price_is_capped(web3):
+    assert GasStrategy(web3, GWEI, GWEI, 50).price() == GWEI
+
+
+def test_falls_back_to_gas_price(node, web3, monkeypatch):
+    unsupported(node, monkeypatch, 'eth_feeHistory')
+    strategy = GasStrategy(web3, 5 * GWEI, 100 * GWEI, 50, ttl=0)
+    assert strategy.price() == GWEI
+    assert not strategy.fee_history
+
+
+def test_falls_back_to_default_price(node, web3, monkeypatch):
+    unsupported(node, monkeypatch, 'eth_feeHistory', 'eth_gasPrice')
+    assert GasStrategy(web3, 5 * GWEI, 100 * GWEI, 50).price() == 5 * GWEI
+
+
+def test_price_is_cached_for_ttl(node, web3):
+    strategy = GasStrategy(web3, GWEI, 100 * GWEI, 50, ttl=3600)
+    price = strategy.price()
+    node.base_fee = 10 * GWEI
+    assert strategy.price() == price
+    strategy.ttl = 0
+    assert strategy.price() > price
+
+
+def test_bump(web3):
+    strategy = GasStrategy(web3, GWEI, 2 * GWEI, 50)
+    # at least the ratio over the previous price, and never under the market price
+    assert strategy.bump(GWEI, 0.125) == max(GWEI * 9 // 8 + 1, strategy.price())
+    assert strategy.bump(GWEI // 10, 0.125) == strategy.price()
+    assert strategy.bump(int(1.9 * GWEI), 0.125) == 2 * GWEI
+    assert strategy.bump(2 * GWEI, 0.125) is None
@@ -0,0 +1,66 @@
+import numpy as np
+
+from contract.liquidity_pool import PerpetualInfo
+from keeper.liquidation_index import LiquidationPriceIndex
+from keeper.margin_engine import MarginEngine
+
+WAD = 10**18
+
+
+def info(mark_price: float, rate: float = 0.05, funding: float = 0) -> PerpetualInfo:
+    nums = [0] * 36
+    nums[1] = int(mark_price * WAD)
+    nums[4] = int(funding * WAD)
+    nums[6] = int(rate * WAD)
+    return PerpetualInfo(2, '0x' + '0' * 40, nums)
+
+
+def engine(accounts: dict, at: PerpetualInfo) -> MarginEngine:
+    """accounts is trader -> (position, margin at mark price of at)."""
+    engine = MarginEngine()
+    traders = list(accounts.keys())
+    engine.load_columns(traders, np.array([accounts[trader][0] for trader in traders], dtype=np.float64),
+                        np.array([accounts[trader][1] for trader in traders], dtype=np.float64), at)
+    return engine
+
+
+def unsafe_by_headroom(engine: MarginEngine, at: PerpetualInfo) -> set:
+    return set(np.array(engine.traders, dtype=object)[engine.headroom(at) < 0].tolist())
+
+
+def test_unsafe_matches_margin_engine():
+    start = info(100)
+    # margin buffers from 2 to 20 at mark price 100
+    accounts = {}
+    for i in range(10):
+        accounts[f"long{i}"] = (1.0, 2.0 * (i + 1) + 5)
+        accounts[f"short{i}"] = (-2.0, 4.0 * (i + 1) + 10)
+    accounts_engine = engine(accounts, start)
+    index = LiquidationPriceIndex()
+    index.build(accounts_engine)
+    for mark_price in (80, 90, 95, 100, 105, 110, 120):
+        at = info(mark_price)
+        assert set(index.unsafe(at)) == unsafe_by_headroom(accounts_engine, at)
+
+
+def test_crossed_returns_only_new_unsafe_accounts():
+    start = info(100)
+    accounts_engine = engine({'a': (1.0, 10.0), 'b': (1.0, 20.0), 'c': (-1.0, 10.0)}, start)
+    index = LiquidationPriceIndex()
+    index.build(accounts_engine)
+    assert index.crossed(None, start) == []
+    # a long with 10 margin at 100 is unsafe under about 94.7
+    assert index.crossed(start, info(94)) == ['a']
+    assert set(index.crossed(info(94), info(80))) == {'b'}
+    # moving back does not report the longs again, the short crosses going up
+    assert index.crossed(info(80), info(106)) == ['c']
+
+
+def test_rebuild_follows_engine_version():
+    start = info(100)
+    accounts_engine = engine({'a': (1.0, 10.0)}, start)
+    index = LiquidationPriceIndex()
+    index.build(accounts_engine)
+    accounts_engine.remove('a')
+    index.build(accounts_engine)
+    assert index.unsafe(info(50)) == []
@@ -0,0 +1,131 @@
+"""Event-driven paths against the mock node: account index updates, quiet perpetuals and discovery."""
+import pytest
+from web3 import Web3
+
+import config
+from benchmark.mock_node import MockNode, READER_ADDRESS, WAD
+from contract.liquidity_pool import LiquidityPool
+from contract.reader import Reader
+from keeper.account_index import AccountIndex
+from keeper.page_sizer import PageSizer
+from keeper.perpetual_discovery import PerpetualDiscovery
+from keeper.perpetual_state import PerpetualStates
+from lib.address import Address
+from lib.batch_call import BatchCaller
+
+
+@pytest.fixture
+def node():
+    node = MockNode(2, 20).start()
+    yield node
+    node.stop()
+
+
+@pytest.fixture
+def web3(node):
+    return Web3(Web3.HTTPProvider(node.url))
+
+
+def perpetuals(node, web3) -> dict:
+    return dict((key, LiquidityPool(web3, Address(key.split("-")[0]))) for key in node.perpetuals)
+
+
+def synced_index(node, web3, pool: LiquidityPool):
+    index = AccountIndex(pool, 0, BatchCaller(web3), PageSizer(8, 1, 100, 1))
+    reader = Reader(web3, Address(READER_ADDRESS))
+    info = pool.perpetual_info(0)
+    for _ in index.sync(reader, node.block_number, info, pool.accounts_count(0)):
+        pass
+    return index, reader
+
+
+def test_trade_event_refreshes_the_trader(node, web3):
+    pool = perpetuals(node, web3)[node.perpetuals[0]]
+    index, reader = synced_index(node, web3, pool)
+    assert index.engine.size == 20
+    trader = '0x' + '12' * 20
+    node.trade(pool.address.address, trader, WAD, -50 * WAD)
+    node.mine()
+    info = pool.perpetual_info(0)
+    accounts = [accounts for accounts in index.sync(reader, node.block_number, info, pool.accounts_count(0))]
+    assert len(accounts) == 1
+    assert accounts[0].addresses == [bytes.fromhex(trader[2:])]
+    assert accounts[0].unsafe_addresses() == []
+    assert index.engine.size == 21
+    assert index.block_number == node.block_number
+
+
+def test_liquidate_event_removes_the_trader(node, web3):
+    pool = perpetuals(node, web3)[node.perpetuals[0]]
+    index, reader = synced_index(node, web3, pool)
+    trader = node.pools[pool.address.address.lower()].traders[0]
+    node.trade(pool.address.address, trader, 0, 0)
+    node.mine()
+    for _ in index.sync(reader, node.block_number, pool.perpetual_info(0), pool.accounts_count(0)):
+        pass
+    assert bytes.fromhex(trader[2:]) not in index.engine.rows
+    assert index.engine.size == 19
+
+
+def test_quiet_perpetuals_are_skipped_until_touched(node, web3, monkeypatch):
+    monkeypatch.setattr(config, 'ACCOUNT_RESYNC_INTERVAL', 3600)
+    pools = perpetuals(node, web3)
+    states = PerpetualStates(web3, 60, 1000)
+    indexes = {}
+    for key, pool in pools.items():
+        indexes[key] = synced_index(node, web3, pool)[0]
+        states.mark_clean(key, pool.perpetual_info(0), pool.accounts_count(0), node.block_number)
+    node.mine()
+
+    def select():
+        current = dict((key, (pool.perpetual_info(0), pool.accounts_count(0))) for key, pool in pools.items())
+        return states.select(pools, current, indexes, node.block_number)
+    assert select() == []
+
+    touched = node.perpetuals[1]
+    node.trade(touched.split("-")[0], '0x' + '34' * 20, WAD, 50 * WAD)
+    node.mine()
+    assert select() == [touched]
+    # a failed state read drops the clean mark
+    assert states.select(pools, {}, indexes, node.block_number, [node.perpetuals[0]]) == []
+    assert node.perpetuals[0] not in states.clean
+
+
+def test_discovery_follows_perpetual_events(node, web3, monkeypatch):
+    monkeypatch.setattr(config, 'MAX_LOG_BLOCK_RANGE', 1000)
+    discovery = PerpetualDiscovery(web3, 3600, 1)
+    # keys are lowercase, as from the graph
+    pool_address = node.perpetuals[0].split("-")[0].lower()
+    discovery.restore([f"{pool_address}-0"], node.block_number)
+    node.emit(pool_address, 'CreatePerpetual', [], [1] + ['0x' + '0' * 40] * 5 + [[0] * 9, [0] * 7])
+    node.mine()
+    discovery.refresh_events()
+    assert sorted(discovery.snapshot()) == [f"{pool_address}-0", f"{pool_address}-1"]
+    node.emit(pool_address, 'SetClearedState', [], [0])
+    node.mine()
+    discovery.refresh_events()
+    assert list(discovery.snapshot()) == [f"{pool_address}-1"]
+
+
+def test_discovery_keeps_event_perpetuals_until_graph_lists_them(node, web3, monkeypatch):
+    monkeypatch.setattr(config, 'MAX_LOG_BLOCK_RANGE', 1000)
+    discovery = PerpetualDiscovery(web3, 3600, 1)
+    pool_address = node.perpetuals[0].split("-")[0].lower()
+    graph = [f"{pool_address}-0"]
+    monkeypatch.setattr(discovery, '_get_graph_perpetuals', lambda: list(graph))
+    discovery.refresh_graph()
+    discovery.block_number = node.block_number
+    node.emit(pool_address, 'CreatePerpetual', [], [1] + ['0x' + '0' * 40] * 5 + [[0] * 9, [0] * 7])
+    node.emit(pool_address, 'CreatePerpetual', [], [2] + ['0x' + '0' * 40] * 5 + [[0] * 9, [0] * 7])
+    node.mine()
+    discovery.refresh_events()
+    # the graph lags behind the events
+    discovery.refresh_graph()
+    assert sorted(discovery.snapshot()) == [f"{pool_address}-0", f"{pool_address}-1", f"{pool_address}-2"]
+    graph.append(f"{pool_address}-1")
+    node.emit(pool_address, 'SetEmergencyState', [], [2, 0, 0])
+    node.mine()
+    discovery.refresh_events()
+    discovery.refresh_graph()
+    assert sorted(discovery.snapshot()) == [f"{pool_address}-0", f"{pool_address}-1"]
+    assert discovery.found == {}
@@ -0,0 +1,49 @@
+from keeper.page_sizer import PageSizer
+
+
+def test_grows_on_fast_full_pages_up_to_max():
+    sizer = PageSizer(100, 10, 400, 1)
+    sizer.success('a', 100, 0.1, True)
+    assert sizer.size('a') == 200
+    sizer.success('a', 200, 0.1, True)
+    sizer.success('a', 400, 0.1, True)
+    assert sizer.size('a') == 400
+
+
+def test_keeps_size_on_partial_or_moderate_pages():
+    sizer = PageSizer(100, 10, 400, 1)
+    sizer.success('a', 100, 0.1, False)
+    sizer.success('a', 100, 0.8, True)
+    assert sizer.size('a') == 100
+
+
+def test_shrinks_slow_pages_to_target():
+    sizer = PageSizer(100, 10, 400, 1)
+    sizer.success('a', 100, 4, True)
+    assert sizer.size('a') == 25
+    sizer.success('a', 25, 100, True)
+    assert sizer.size('a') == 10
+
+
+def test_failure_halves_and_grows_toward_ceiling():
+    sizer = PageSizer(200, 10, 1000, 1)
+    assert sizer.failure('a', 200)
+    assert sizer.size('a') == 100
+    # doubling would reach the failed size, the gap is halved instead
+    sizer.success('a', 100, 0.1, True)
+    assert sizer.size('a') == 150
+    assert not sizer.failure('a', 10)
+
+
+def test_ceiling_expires():
+    sizer = PageSizer(200, 10, 1000, 1, ceiling_ttl=0)
+    sizer.failure('a', 200)
+    sizer.success('a', 100, 0.1, True)
+    assert sizer.size('a') == 200
+
+
+def test_keys_are_independent():
+    sizer = PageSizer(100, 10, 400, 1)
+    sizer.failure('a', 100)
+    assert sizer.size('a') == 50
+    assert sizer.size('b') == 100
@@ -0,0 +1,97 @@
+"""MultiHTTPProvider over fake endpoints: hedging, head pinning, failover and broadcast."""
+import time
+
+import pytest
+
+from lib.provider import MultiHTTPProvider
+
+
+class FakeEndpoint:
+    def __init__(self, uri: str, head: int = 100, delay: float = 0, down: bool = False):
+        self.endpoint_uri = uri
+        self.head = head
+        self.delay = delay
+        self.down = down
+        self.methods = []
+
+    def make_request(self, method, params):
+        self.methods.append(method)
+        time.sleep(self.delay)
+        if self.down:
+            raise ConnectionError(f"{self.endpoint_uri} is down")
+        if method == 'eth_blockNumber':
+            return {'jsonrpc': '2.0', 'id': 1, 'result': hex(self.head)}
+        if method == 'eth_sendRawTransaction' and self.endpoint_uri != 'a':
+            return {'jsonrpc': '2.0', 'id': 1, 'error': {'code': -32000, 'message': 'already known'}}
+        return {'jsonrpc': '2.0', 'id': 1, 'result': self.endpoint_uri}
+
+    def make_batch_request(self, calls: list) -> list:
+        return [self.make_request(method, params) for method, params in calls]
+
+
+def provider(*fakes, **kwargs) -> MultiHTTPProvider:
+    result = MultiHTTPProvider([fake.endpoint_uri for fake in fakes], **kwargs)
+    for endpoint, fake in zip(result.endpoints, fakes):
+        endpoint.provider = fake
+    return result
+
+
+def test_first_healthy_endpoint_answers():
+    a, b = FakeEndpoint('a'), FakeEndpoint('b')
+    assert provider(a, b).make_request('eth_call', [])['result'] == 'a'
+    assert b.methods == []
+
+
+def test_hedges_after_delay():
+    a, b = FakeEndpoint('a', delay=0.5), FakeEndpoint('b')
+    start = time.time()
+    assert provider(a, b, hedge_delay=0.05).make_request('eth_call', [])['result'] == 'b'
+    assert time.time() - start < 0.4
+
+
+def test_fails_over_on_transport_error():
+    a, b = FakeEndpoint('a', down=True), FakeEndpoint('b')
+    p = provider(a, b, max_failures=1)
+    assert p.make_request('eth_call', [])['result'] == 'b'
+    # a is in cooldown, b is tried first
+    assert p.make_request('eth_call', [])['result'] == 'b'
+    assert a.methods == ['eth_call']
+
+
+def test_raises_when_all_endpoints_fail():
+    with pytest.raises(ConnectionError):
+        provider(FakeEndpoint('a', down=True), FakeEndpoint('b', down=True)).make_request('eth_call', [])
+
+
+def test_reads_pinned_to_head():
+    a, b = FakeEndpoint('a', head=100), FakeEndpoint('b', head=101)
+    p = provider(a, b)
+    assert int(p.make_request('eth_blockNumber', [])['result'], 16) in (100, 101)
+    # the slower answer still updates the head of its endpoint
+    time.sleep(0.05)
+    for _ in range(3):
+        assert p.make_request('eth_getLogs', [])['result'] == 'b'
+    # chain id does not depend on the head
+    b.delay = 0.5
+    assert p._hedged('eth_chainId', lambda provider: provider.make_request('eth_chainId', []), False)['result'] == 'a'
+
+
+def test_pinned_read_fails_over_to_lagging_endpoint():
+    a, b = FakeEndpoint('a', head=100), FakeEndpoint('b', head=101)
+    p = provider(a, b)
+    p.make_request('eth_blockNumber', [])
+    time.sleep(0.05)
+    b.down = True
+    assert p.make_request('eth_getLogs', [])['result'] == 'a'
+    assert p.make_batch_request([('eth_call', [])])[0]['result'] == 'a'
+
+
+def test_broadcast_returns_first_success():
+    a, b = FakeEndpoint('a', delay=0.1), FakeEndpoint('b')
+    assert provider(a, b).make_request('eth_sendRawTransaction', ['0x'])['result'] == 'a'
+    assert a.methods == b.methods == ['eth_sendRawTransaction']
+
+
+def test_broadcast_returns_error_when_no_success():
+    a, b = FakeEndpoint('a', down=True), FakeEndpoint('b')
+    assert provider(a, b).make_request('eth_sendRawTransaction', ['0x'])['error']['message'] == 'already known'
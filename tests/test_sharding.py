@@ -0,0 +1,59 @@
+from keeper.sharding import HashRing
+from lib.coordinator import SqliteCoordinator
+
+KEYS = [f"0x{i:040x}-0" for i in range(500)]
+
+
+def test_ring_spreads_keys_over_members():
+    ring = HashRing(['a', 'b', 'c'])
+    owners = [ring.owner(key) for key in KEYS]
+    for member in ('a', 'b', 'c'):
+        assert owners.count(member) > len(KEYS) / 6
+
+
+def test_ring_only_moves_keys_of_the_leaving_member():
+    before = HashRing(['a', 'b', 'c'])
+    after = HashRing(['a', 'b'])
+    for key in KEYS:
+        if before.owner(key) != 'c':
+            assert after.owner(key) == before.owner(key)
+        else:
+            assert after.owner(key) in ('a', 'b')
+
+
+def test_empty_ring_has_no_owner():
+    assert HashRing([]).owner(KEYS[0]) is None
+
+
+def test_claim_is_held_by_one_member(tmp_path):
+    path = str(tmp_path / 'coordinator.db')
+    a = SqliteCoordinator(path, 'a')
+    b = SqliteCoordinator(path, 'b')
+    assert a.claim('key', 60)
+    assert not b.claim('key', 60)
+    # renewing its own claim
+    assert a.claim('key', 60)
+    a.release('key')
+    assert b.claim('key', 60)
+    assert not a.claim('key', 60)
+
+
+def test_expired_claim_is_taken_over(tmp_path):
+    path = str(tmp_path / 'coordinator.db')
+    a = SqliteCoordinator(path, 'a')
+    b = SqliteCoordinator(path, 'b')
+    assert a.claim('key', -1)
+    assert b.claim('key', 60)
+
+
+def test_members_follow_leases(tmp_path):
+    path = str(tmp_path / 'coordinator.db')
+    a = SqliteCoordinator(path, 'a')
+    b = SqliteCoordinator(path, 'b')
+    a.heartbeat(60)
+    b.heartbeat(-1)
+    assert a.members() == ['a']
+    b.heartbeat(60)
+    assert a.members() == ['a', 'b']
+    b.leave()
+    assert a.members() == ['a']
@@ -0,0 +1,96 @@
+"""Submitter against the mock node: reward cap, skips and replacements."""
+import pytest
+from eth_account import Account
+from web3 import Web3
+
+from benchmark.mock_node import MockNode
+from contract.liquidity_pool import LiquidityPool
+from keeper.gas_strategy import GasStrategy
+from keeper.submitter import Liquidation, Submitter
+from lib.address import Address
+
+GWEI = 10**9
+GAS = 300000
+
+
+@pytest.fixture
+def node():
+    node = MockNode(1, 4).start()
+    yield node
+    node.stop()
+
+
+@pytest.fixture
+def submitter(node):
+    web3 = Web3(Web3.HTTPProvider(node.url))
+    submitter = Submitter(web3, Account.from_key('0x' + '11' * 32), GasStrategy(web3, GWEI, 100 * GWEI, 50), gas_margin=1)
+    submitter.chain_id = 1
+    return submitter
+
+
+def liquidation(node, submitter, max_gas_cost=None, statuses=None) -> tuple:
+    key = node.perpetuals[0]
+    pool = LiquidityPool(submitter.web3, Address(key.split("-")[0]))
+    trader = bytes.fromhex(next(iter(node.pools[pool.address.address.lower()].accounts))[2:])
+    result = Liquidation(pool, int(key.split("-")[1]), trader, None if statuses is None else statuses.append)
+    result.max_gas_cost = max_gas_cost
+    submitter.submit(result)
+    tx = dict(pool.liquidate_by_amm_call(result.perpetual_index, trader).params(), **{'from': submitter.account.address})
+    return result, tx
+
+
+def test_sends_at_market_price(node, submitter):
+    result, tx = liquidation(node, submitter)
+    submitter._send(result, tx, GAS)
+    assert result.gas_price == submitter.gas_strategy.price()
+    assert result.tx['nonce'] == 0 and result.tx['gas'] == GAS
+    assert list(submitter.pending) == [result.tx_hash]
+    assert len(node.liquidations) == 1
+
+
+def test_sends_under_the_reward_cap(node, submitter):
+    price = submitter.gas_strategy.price()
+    result, tx = liquidation(node, submitter, max_gas_cost=10 * price * GAS)
+    submitter._send(result, tx, GAS)
+    assert result.gas_price == price
+
+
+def test_skips_when_the_cap_is_under_market_price(node, submitter):
+    statuses = []
+    result, tx = liquidation(node, submitter, max_gas_cost=submitter.gas_strategy.price() * GAS // 2, statuses=statuses)
+    submitter._send(result, tx, GAS)
+    assert statuses == [0]
+    assert result.tx_hash is None and submitter.liquidations == {} and submitter.pending == {}
+    assert len(node.liquidations) == 0
+    # the nonce is left for the next liquidation
+    assert submitter.nonce_manager.nonce is None
+
+
+def test_replace_bumps_the_price(node, submitter):
+    result, tx = liquidation(node, submitter)
+    submitter._send(result, tx, GAS)
+    first_hash, first_price = result.tx_hash, result.gas_price
+    submitter._replace(result)
+    assert result.gas_price >= first_price * 1.1
+    assert result.replacements == 1 and result.tx['nonce'] == 0
+    # both transactions are tracked until one is mined
+    assert set(submitter.pending) == {first_hash, result.tx_hash}
+    submitter._done(result, 1)
+    assert submitter.pending == {}
+
+
+def test_replace_stops_at_the_reward_cap(node, submitter):
+    price = submitter.gas_strategy.price()
+    result, tx = liquidation(node, submitter, max_gas_cost=int(price * 1.05) * GAS)
+    submitter._send(result, tx, GAS)
+    submitter._replace(result)
+    assert result.gas_price == price and result.replacements == 0
+    assert len(result.tx_hashes) == 1
+
+
+def test_replace_stops_at_max_price(node, submitter):
+    submitter.gas_strategy.max_price = submitter.gas_strategy.price()
+    result, tx = liquidation(node, submitter)
+    submitter._send(result, tx, GAS)
+    submitter._replace(result)
+    assert result.replacements == 0
@@ -0,0 +1,35 @@
+from lib.wad import Wad
+
+WAD = 10**18
+
+
+def test_arithmetic_is_exact_on_large_values():
+    a = Wad(123456789 * WAD + 987654321)
+    b = Wad(3 * WAD)
+    assert (a + b).value == 123456792 * WAD + 987654321
+    assert (a - b).value == 123456786 * WAD + 987654321
+    assert (a * b).value == 370370367 * WAD + 2962962963
+    assert (b * 2).value == 6 * WAD
+
+
+def test_mul_and_div_round_toward_zero():
+    third = Wad(WAD) / Wad(3 * WAD)
+    assert third.value == 333333333333333333
+    assert (Wad(-WAD) / Wad(3 * WAD)).value == -333333333333333333
+    assert (Wad(-1) * Wad(WAD // 2)).value == 0
+
+
+def test_from_number_and_str():
+    assert Wad.from_number(1.5).value == 15 * WAD // 10
+    assert Wad.from_number('0.000000000000000001').value == 1
+    assert str(Wad(15 * WAD // 10)) == "1.500000000000000000"
+    assert str(Wad(-WAD // 2)) == "-0.500000000000000000"
+
+
+def test_compare_min_max():
+    assert Wad(1) < Wad(2)
+    assert Wad(2) >= Wad(2)
+    assert Wad.min(Wad(3), Wad(1), Wad(2)) == Wad(1)
+    assert Wad.max(Wad(3), Wad(1), Wad(2)) == Wad(3)
+    assert abs(Wad(-5)) == Wad(5)
+    assert float(Wad(WAD // 4)) == 0.25
@@ -5,15 +5,30 @@ import time
 
 from web3 import Web3
 
+from lib.metrics import Counter, Gauge, Histogram
+
+SKIPPED_TICKS = Counter('keeper_skipped_ticks_total', "Ticks dropped as the previous callback was still running")
+BLOCK_LAG = Histogram('keeper_block_lag_seconds', "Time from the timestamp of a head to the start of its sync")
+LAST_BLOCK_LAG = Gauge('keeper_last_block_lag_seconds', "Time from the timestamp of the last synced head to the start of its sync")
+
 class Watcher:
     logger = logging.getLogger()
 
-    def __init__(self, web3: Web3 = None):
+    def __init__(self, web3: Web3 = None, block_driven: bool = False, poll_interval: float = 0.5, interval: float = 20, profiler=None):
         self.web3 = web3
         self.block_syncers = []
+        # block driven: run syncers on each new head polled every poll_interval
+        # otherwise: run syncers every interval seconds
+        self.block_driven = block_driven
+        self.poll_interval = poll_interval
+        self.interval = interval
+        # optional SamplingProfiler run around the syncers
+        self.profiler = profiler
 
         self.terminated = False
         self._last_block_time = None
+        # seconds from the timestamp of the last synced head to its sync start
+        self.block_lag = None
 
     def run(self):
         if self.web3 is None:
@@ -45,6 +60,8 @@ class Watcher:
     def add_block_syncer(self, callback):
         assert(callable(callback))
         assert(self.web3 is not None)
+        if self.profiler is not None:
+            callback = self.profiler.wrap(callback)
         self.block_syncers.append(AsyncThread(callback))
 
     def set_terminated(self):
@@ -64,16 +81,26 @@ class Watcher:
             #    if not self.web3.eth.syncing:
             #        self.logger.fatal("No new blocks received for 300 seconds, the keeper will terminate")
             #        break
-            
-#            for event in event_filter.get_new_entries():
-            self._sync_block()
-            time.sleep(20)
+
+            if self.block_driven:
+                self._poll_block()
+                time.sleep(self.poll_interval)
+            else:
+                self._sync_block()
+                time.sleep(self.interval)
 
         for block_syncer in self.block_syncers:
             block_syncer.wait()
 
+    def _poll_block(self):
+        try:
+            block = self.web3.eth.getBlock('latest')
+        except Exception as e:
+            self.logger.warning(f"get latest block error:{e}")
+            return
+        self._sync_block(block)
 
-    def _sync_block(self):
+    def _sync_block(self, block=None):
         self._last_block_time = int(time.time())
         #block = self.web3.eth.getBlock(block_hash)
         #block_number = block['number']
@@ -96,9 +123,26 @@ class Watcher:
         def on_finish():
             self.logger.debug(f"Finished processing the syncer")
         for block_syncer in self.block_syncers:
+            # already synced this head, or a later one
+            if block is not None and block_syncer.block_number is not None and block_syncer.block_number >= block['number']:
+                continue
             if not block_syncer.run(on_start, on_finish):
+                # ticks are coalesced, the next poll syncs the latest head once the callback is done
+                if block is None:
+                    SKIPPED_TICKS.inc()
+                elif block_syncer.skipped_block_number != block['number']:
+                    # a head is polled again and again while the callback runs, count it once
+                    block_syncer.skipped_block_number = block['number']
+                    SKIPPED_TICKS.inc()
                 self.logger.debug(f"Ignoring"
                                     f" as previous callback is still running")
+                continue
+            if block is not None:
+                block_syncer.block_number = block['number']
+                self.block_lag = time.time() - block['timestamp']
+                BLOCK_LAG.observe(self.block_lag)
+                LAST_BLOCK_LAG.set(self.block_lag)
+                self.logger.debug(f"Syncing block #{block['number']} lag:{self.block_lag:.3f}s")
                 
 
     def _sigal_handler(self, sig, frame):
@@ -112,6 +156,10 @@ class AsyncThread:
     def __init__(self, callback):
         self.callback = callback
         self.thread = None
+        # last block the callback was started for
+        self.block_number = None
+        # last block skipped while the callback was running, counted once
+        self.skipped_block_number = None
 
     def run(self, on_start=None, on_finish=None) -> bool:
         #ensure the same block_syncer only one thread running at the same time